@@ -262,8 +262,12 @@ doc_events = {
         "after_insert": "tally_connect.tally_integration.customer.create_customer_ledger_on_insert"
     },
     "Sales Order": {
+        "before_save": "tally_connect.tally_integration.api.validators.reset_masters_verified",
         "on_submit": "tally_connect.tally_integration.doctype_handlers.sales_order.on_submit"
     },
+    "Sales Invoice": {
+        "before_save": "tally_connect.tally_integration.api.validators.reset_masters_verified"
+    },
     # "Sales Invoice": {
     #     "on_submit": "tally_connect.tally_integration.doctype_handlers.sales_invoice.on_submit"
     # }
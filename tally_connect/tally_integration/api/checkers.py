@@ -3,8 +3,15 @@ Tally Checker APIs
 Read-only operations to check if masters/vouchers exist in Tally
 """
 
+import json
+
 import frappe
-from tally_connect.tally_integration.utils import check_master_exists
+from tally_connect.tally_integration.utils import (
+    check_master_exists,
+    check_masters_bulk,
+    check_masters_exist_bulk,
+    clear_master_exists_cache
+)
 
 
 # ==================== PUBLIC WRAPPER FUNCTIONS ====================
@@ -59,6 +66,17 @@ def check_gst_classification_exists(classification_name):
     """Check if a GST Classification exists in Tally"""
     return _check_master_exists("GSTClassification", classification_name)
 
+@frappe.whitelist()
+def clear_master_cache(master_type=None, master_name=None):
+    """
+    Forget cached Tally existence answers so the next check asks Tally
+    
+    Use after deleting/renaming masters directly in Tally. With no
+    arguments everything is cleared.
+    """
+    clear_master_exists_cache(master_type, master_name)
+    return {"success": True}
+
 # ==================== INTERNAL HELPER ====================
 
 def _check_master_exists(master_type, master_name):
@@ -114,8 +132,6 @@ def batch_check_masters(master_type, names):
         from tally_connect.tally_integration.api import batch_check_masters
         result = batch_check_masters('StockItem', ['ITEM-001', 'ITEM-002'])
     """
-    import json
-    
     # Handle JSON string input (from frontend)
     if isinstance(names, str):
         names = json.loads(names)
@@ -123,9 +139,11 @@ def batch_check_masters(master_type, names):
     existing = []
     missing = []
     
+    # One Tally collection export for the whole batch
+    exists_map = check_masters_bulk((master_type, name) for name in names)
+    
     for name in names:
-        result = _check_master_exists(master_type, name)
-        if result.get("exists"):
+        if exists_map.get((master_type, name)):
             existing.append(name)
         else:
             missing.append(name)
@@ -163,37 +181,39 @@ def check_document_dependencies(document_type, document_name):
     existing_masters = []
     checks = {}
     
-    # Check customer (for SO, SI, DN)
-    if hasattr(doc, "customer"):
-        result = check_ledger_exists(doc.customer)
-        checks["customer"] = result
-        
-        if result.get("exists"):
-            existing_masters.append(f"Customer: {doc.customer}")
-        else:
-            missing_masters.append(f"Customer: {doc.customer}")
+    parties = []
+    if hasattr(doc, "customer"):   # SO, SI, DN
+        parties.append(("customer", "Customer", doc.customer))
+    if hasattr(doc, "supplier"):   # PO, PI
+        parties.append(("supplier", "Supplier", doc.supplier))
+    items = doc.items if hasattr(doc, "items") else None
     
-    # Check supplier (for PO, PI)
-    if hasattr(doc, "supplier"):
-        result = check_ledger_exists(doc.supplier)
-        checks["supplier"] = result
+    # One Tally round-trip per master type instead of one per row
+    exists_map = check_masters_exist_bulk({
+        "Ledger": [name for _, _, name in parties if name],
+        "StockItem": [item.item_code for item in items or [] if item.item_code]
+    })
+    
+    for key, label, name in parties:
+        exists = exists_map.get(("Ledger", name), False)
+        checks[key] = {"exists": exists, "name": name, "master_type": "Ledger"}
         
-        if result.get("exists"):
-            existing_masters.append(f"Supplier: {doc.supplier}")
+        if exists:
+            existing_masters.append(f"{label}: {name}")
         else:
-            missing_masters.append(f"Supplier: {doc.supplier}")
+            missing_masters.append(f"{label}: {name}")
     
     # Check items
-    if hasattr(doc, "items"):
+    if items is not None:
         checks["items"] = []
-        for item in doc.items:
-            result = check_stock_item_exists(item.item_code)
+        for item in items:
+            exists = exists_map.get(("StockItem", item.item_code), False)
             checks["items"].append({
                 "item_code": item.item_code,
-                "exists": result.get("exists")
+                "exists": exists
             })
             
-            if result.get("exists"):
+            if exists:
                 existing_masters.append(f"Item: {item.item_code}")
             else:
                 missing_masters.append(f"Item: {item.item_code}")
@@ -253,11 +273,11 @@ def check_tally_company():
 # ADD TO END OF checkers.py
 
 @frappe.whitelist()
-def check_dependencies_and_create_requests(doctype, docname, company):
+def check_dependencies_and_create_requests(doctype, docname, company, doc=None):
     """
     Check dependencies and create requests for missing masters
     
-    Called from: Document submit hooks
+    Called from: Document submit hooks (pass doc=self to skip reloading it)
     
     Returns:
         dict: {
@@ -268,7 +288,11 @@ def check_dependencies_and_create_requests(doctype, docname, company):
     """
     from tally_connect.tally_integration.api.dependency_checker import check_dependencies_for_document
     
-    missing = check_dependencies_for_document(doctype, docname, company)
+    # Whitelisted calls get doc as a JSON string - ignore it and load ourselves
+    if not hasattr(doc, "doctype"):
+        doc = None
+    
+    missing = check_dependencies_for_document(doctype, docname, company, doc=doc)
     
     if not missing:
         return {
@@ -280,6 +304,10 @@ def check_dependencies_and_create_requests(doctype, docname, company):
     requests_created = []
     
     for master in missing:
+        # Tax ledgers have no request workflow - set up manually in Tally
+        if master["type"] == "Tax Ledger":
+            continue
+        
         request = frappe.get_doc({
             "doctype": "Tally Master Creation Request",
             "master_type": master["type"],
@@ -2115,6 +2115,11 @@ from tally_connect.tally_integration.utils import (
     format_amount_for_tally,
     get_address_from_gstin,
     get_tally_company_for_erpnext_company,
+    get_account_group_names,
+    get_party_account,
+    get_request_cache,
+    log_error_once,
+    clear_master_exists_cache,
 )
 from tally_connect.tally_integration.api.checkers import check_ledger_exists
 
@@ -2195,7 +2200,7 @@ def get_tally_company_for_erpnext_company(company_name):
     
     # Try to get from Company custom field
     try:
-        company = frappe.get_doc("Company", company_name)
+        company = frappe.get_cached_doc("Company", company_name)
         if hasattr(company, 'custom_tally_company_name') and company.custom_tally_company_name:
             return company.custom_tally_company_name
     except:
@@ -2289,6 +2294,7 @@ def get_customer_parent_group(customer_name, company):
     """
     Get parent ledger group for customer based on company's default account
     Uses: Company > Accounts > Default Receivable Account > Account Name
+    Memoized per request - the answer cannot change within one submit.
     
     Args:
         customer_name: Customer name
@@ -2298,30 +2304,33 @@ def get_customer_parent_group(customer_name, company):
     Returns:
         str: Parent group name (e.g., "Sundry Debtors")
     """
+    cache = get_request_cache("tally_customer_parent_group")
+    key = (customer_name, company)
+    if key not in cache:
+        cache[key] = _get_customer_parent_group(customer_name, company)
+    return cache[key]
+
+
+def _get_customer_parent_group(customer_name, company):
     try:
-        # Get customer document
-        customer = frappe.get_doc("Customer", customer_name)
-        
-        # Find default receivable account for this company
-        for account in customer.accounts:
-            if account.company == company:
-                if account.account:
-                    # Get account document to find parent
-                    account_doc = frappe.get_doc("Account", account.account)
-                    # Return parent account name (this is the group in Tally)
-                    if account_doc.parent_account:
-                        parent_doc = frappe.get_doc("Account", account_doc.parent_account)
-                        return parent_doc.account_name
-                    return account_doc.account_name
+        # Default receivable account for this company - reads only the
+        # Party Account row (an unknown customer simply has none)
+        account = get_party_account("Customer", customer_name, company)
+        if account:
+            # Account + parent names in one joined query
+            names = get_account_group_names(account)
+            # Return parent account name (this is the group in Tally)
+            if names:
+                return names.parent_name or names.account_name
         
         # Fallback to settings
         settings = get_settings()
         return settings.default_customer_ledger or "Sundry Debtors"
     
     except Exception as e:
-        frappe.log_error(
+        log_error_once(
             f"Error getting customer parent group for {customer_name}: {str(e)}", 
-            "Tally Creators"
+            "Tally Creators - Customer Parent Group"
         )
         settings = get_settings()
         return settings.default_customer_ledger or "Sundry Debtors"
@@ -2330,6 +2339,7 @@ def get_customer_parent_group(customer_name, company):
 def get_supplier_parent_group(supplier_name, company):
     """
     Get parent ledger group for supplier based on company's default account
+    Memoized per request.
     
     Args:
         supplier_name: Supplier name
@@ -2338,27 +2348,30 @@ def get_supplier_parent_group(supplier_name, company):
     Returns:
         str: Parent group name (e.g., "Sundry Creditors")
     """
+    cache = get_request_cache("tally_supplier_parent_group")
+    key = (supplier_name, company)
+    if key not in cache:
+        cache[key] = _get_supplier_parent_group(supplier_name, company)
+    return cache[key]
+
+
+def _get_supplier_parent_group(supplier_name, company):
     try:
-        supplier = frappe.get_doc("Supplier", supplier_name)
-        
-        # Find default payable account for this company
-        for account in supplier.accounts:
-            if account.company == company:
-                if account.account:
-                    account_doc = frappe.get_doc("Account", account.account)
-                    if account_doc.parent_account:
-                        parent_doc = frappe.get_doc("Account", account_doc.parent_account)
-                        return parent_doc.account_name
-                    return account_doc.account_name
+        # Default payable account for this company
+        account = get_party_account("Supplier", supplier_name, company)
+        if account:
+            names = get_account_group_names(account)
+            if names:
+                return names.parent_name or names.account_name
         
         # Fallback
         settings = get_settings()
         return settings.default_supplier_ledger or "Sundry Creditors"
     
     except Exception as e:
-        frappe.log_error(
+        log_error_once(
             f"Error getting supplier parent group for {supplier_name}: {str(e)}", 
-            "Tally Creators"
+            "Tally Creators - Supplier Parent Group"
         )
         settings = get_settings()
         return settings.default_supplier_ledger or "Sundry Creditors"
@@ -2467,6 +2480,8 @@ def create_group_in_tally(group_name, parent_group, company=None, is_revenue=Fal
     
     # Send to Tally
     result = send_xml_to_tally(log, group_xml)
+    if result.get("success"):
+        clear_master_exists_cache("Group", group_name)
     
     # Handle result
     if not result.get("success"):
@@ -2545,13 +2560,13 @@ def create_customer_ledger_in_tally(customer_name, company=None):
             # No mapping → put directly under base group
             parent_group = base_group
         else:
-            account_doc = frappe.get_doc("Account", default_account_id)
+            account_doc = frappe.get_cached_doc("Account", default_account_id)
             # Use account.account_name as group (e.g. Blinkit)
             parent_group = account_doc.account_name
 
             if account_doc.parent_account:
                 try:
-                    erp_parent = frappe.get_doc("Account", account_doc.parent_account)
+                    erp_parent = frappe.get_cached_doc("Account", account_doc.parent_account)
                     erp_parent_name = erp_parent.account_name
                 except Exception:
                     erp_parent_name = None
@@ -2670,7 +2685,6 @@ def create_customer_ledger_in_tally(customer_name, company=None):
         # 4) Fallback from GSTIN (optional, skip if not configured)
         if not address_doc and customer.gstin:
             try:
-                from tally_connect.tally_integration.utils import get_address_from_gstin
                 data = get_address_from_gstin(customer.gstin)
                 if data:
                     class Dummy:
@@ -2801,6 +2815,8 @@ def create_customer_ledger_in_tally(customer_name, company=None):
 
         # Send to Tally
         result = send_xml_to_tally(log, ledger_xml)
+        if result.get("success"):
+            clear_master_exists_cache("Ledger", customer.customer_name)
 
         if not result.get("success"):
             if result.get("error_type") in ["NETWORK ERROR", "TIMEOUT"]:
@@ -2998,6 +3014,8 @@ def create_supplier_ledger_in_tally(supplier_name, company=None):
         )
         
         result = send_xml_to_tally(log, ledger_xml)
+        if result.get("success"):
+            clear_master_exists_cache("Ledger", supplier.supplier_name)
         
         if not result.get("success"):
             if result.get("error_type") in ["NETWORK ERROR", "TIMEOUT"]:
@@ -3132,6 +3150,8 @@ def create_stock_group_in_tally(stock_group_name, parent_group="Primary", compan
     )
     
     result = send_xml_to_tally(log, stock_group_xml)
+    if result.get("success"):
+        clear_master_exists_cache("StockGroup", stock_group_name)
     
     if not result.get("success"):
         if result.get("error_type") in ["NETWORK ERROR", "TIMEOUT"]:
@@ -3241,6 +3261,8 @@ def create_stock_item_in_tally(item_code, company=None):
                 xml=stock_group_xml,
             )
             group_result = send_xml_to_tally(group_log, stock_group_xml)
+            if group_result.get("success"):
+                clear_master_exists_cache("StockGroup", stock_group)
 
             if not group_result.get("success"):
                 retry_job = None
@@ -3398,6 +3420,8 @@ def create_stock_item_in_tally(item_code, company=None):
         )
 
         result = send_xml_to_tally(log, stock_item_xml)
+        if result.get("success"):
+            clear_master_exists_cache("StockItem", item.item_name)
 
         if not result.get("success"):
             if result.get("error_type") in ["NETWORK ERROR", "TIMEOUT"]:
@@ -3552,6 +3576,8 @@ def create_generic_ledger_in_tally(ledger_name, parent_group, company=None):
             xml=xml_body,
         )
         result = send_xml_to_tally(log, xml_body)
+        if result.get("success"):
+            clear_master_exists_cache("Ledger", ledger_name)
 
         if not result.get("success"):
             return {
@@ -3583,18 +3609,62 @@ def get_uom_map(item_doc):
     return uom_map
 
 
-def qty_display_for_item(item_row, item_doc):
+def get_uom_maps(item_codes):
+    """
+    {item_code: {uom: factor}} for many items in one query.
+    Same data as get_uom_map, without loading each Item document.
+    """
+    uom_maps = {code: {} for code in item_codes}
+    if not uom_maps:
+        return uom_maps
+
+    rows = frappe.get_all(
+        "UOM Conversion Detail",
+        filters={"parenttype": "Item", "parent": ["in", list(uom_maps)]},
+        fields=["parent", "uom", "conversion_factor"],
+        order_by="parent asc, idx asc",
+    )
+    for row in rows:
+        if row.uom and row.conversion_factor:
+            uom_maps[row.parent][row.uom] = float(row.conversion_factor)
+    return uom_maps
+
+
+def get_item_mrps(keys, key_field="name"):
+    """
+    {key: custom_mrp} for many items in one query, keyed on key_field
+    (name or item_name). First match wins, like frappe.db.get_value.
+    """
+    keys = {key for key in keys if key}
+    if not keys:
+        return {}
+
+    try:
+        rows = frappe.db.get_values("Item", {key_field: ["in", list(keys)]}, [key_field, "custom_mrp"])
+    except Exception:
+        # custom_mrp is a site custom field - no field, no MRP line
+        return {}
+
+    mrps = {}
+    for key, mrp in rows:
+        mrps.setdefault(key, mrp)
+    return mrps
+
+
+def qty_display_for_item(item_row, item_doc=None, uom_map=None):
     """
     Build Tally-style quantity string using item UOM conversions.
     - item_row: Sales Invoice Item row
     - item_doc: Item master (frappe.get_doc("Item", item_row.item_code))
+    - uom_map: prefetched {uom: factor} (see get_uom_maps); used instead of item_doc
     """
     qty = abs(float(item_row.qty or 0))
     if not qty:
         return ""
 
     base_uom = item_row.uom or item_row.stock_uom or "Pcs"
-    uom_map = get_uom_map(item_doc)
+    if uom_map is None:
+        uom_map = get_uom_map(item_doc)
 
     base_factor = uom_map.get(base_uom, 1.0)
 
@@ -3690,7 +3760,7 @@ def create_sales_invoice_in_tally(invoice_name):
             }
 
         # ---------- 2. Ensure all masters exist (customer, items, ledgers) ----------
-        master_result = create_missing_masters_for_document("Sales Invoice", invoice_name)
+        master_result = create_missing_masters_for_document("Sales Invoice", invoice_name, doc=inv)
 
         if not master_result.get("success"):
             error_msg = "Could not create required masters in Tally: " + "; ".join(
@@ -3914,6 +3984,7 @@ def create_sales_invoice_in_tally(invoice_name):
             frappe.log_error("Tally Consignee", f"Error building consignee address: {str(e)}")
 
         items_xml = ""
+        item_mrps = get_item_mrps((item.item_name for item in inv.items), key_field="item_name")
         for item in inv.items:
             stock_group = item.item_group or "Primary"
 
@@ -3926,12 +3997,7 @@ def create_sales_invoice_in_tally(invoice_name):
 
             item_mrp_text = ""
             try:
-                mrp_value = int(
-                    frappe.db.get_value(
-                        "Item", {"item_name": item.item_name}, "custom_mrp"
-                    )
-                    or 0
-                )
+                mrp_value = int(item_mrps.get(item.item_name) or 0)
                 if mrp_value:
                     item_mrp_text = f"MRP {mrp_value}"
             except Exception:
@@ -4272,7 +4338,7 @@ def create_clean_sales_invoice_in_tally(invoice_name):
             }
 
         # ---------- 2. Ensure all masters exist ----------
-        master_result = create_missing_masters_for_document("Sales Invoice", invoice_name)
+        master_result = create_missing_masters_for_document("Sales Invoice", invoice_name, doc=inv)
 
         if not master_result.get("success"):
             error_msg = "Could not create required masters in Tally: " + "; ".join(
@@ -4469,12 +4535,14 @@ def create_clean_sales_invoice_in_tally(invoice_name):
 
         # ---------- 6.b Items XML ----------
         items_xml = ""
+        # One query for every row's UOM conversions instead of an Item load per row
+        uom_maps = get_uom_maps({item.item_code for item in inv.items if item.qty})
+        item_mrps = get_item_mrps(item.item_name for item in inv.items if item.qty)
         for item in inv.items:
             if not item.qty:
                 continue
 
-            item_doc = frappe.get_doc("Item", item.item_code)
-            qty_str = qty_display_for_item(item, item_doc)
+            qty_str = qty_display_for_item(item, uom_map=uom_maps[item.item_code])
 
             line_amount = float(item.base_amount or item.amount or 0)
             rate = float(item.base_rate or item.rate or 0)
@@ -4483,7 +4551,7 @@ def create_clean_sales_invoice_in_tally(invoice_name):
             # MRP
             item_mrp_text = ""
             try:
-                mrp_value = int(frappe.db.get_value("Item", {"name": item.item_name}, "custom_mrp") or 0)
+                mrp_value = int(item_mrps.get(item.item_name) or 0)
                 if mrp_value:
                     item_mrp_text = f"MRP {mrp_value}"
             except Exception:
@@ -4854,17 +4922,14 @@ def sync_sales_invoice_now(invoice_name):
 
 def get_reference_date_for_credit_note(credit_note_name: str) -> str | None:
     """Return reference date (sales invoice date) for given Credit Note."""
-    # Load the Credit Note
-    cn = frappe.get_doc("Sales Invoice", credit_note_name)
+    # Only two fields are needed - don't load full invoice docs
+    return_against = frappe.db.get_value("Sales Invoice", credit_note_name, "return_against")
 
-    if not cn.return_against:
+    if not return_against:
         return None  # No linked sales invoice
 
-    # Load the original Sales Invoice
-    si = frappe.get_doc("Sales Invoice", cn.return_against)
-
     # Option 1: business date used on the invoice
-    return str(si.posting_date)
+    return str(frappe.db.get_value("Sales Invoice", return_against, "posting_date"))
 
 
 
@@ -4932,11 +4997,10 @@ def address_two_lines_smart(addr, customer_name="Customer"):
 
 
 def get_reference_date_for_credit_note(credit_note_name: str) -> str | None:
-    cn = frappe.get_doc("Sales Invoice", credit_note_name)
-    if not cn.return_against:
+    return_against = frappe.db.get_value("Sales Invoice", credit_note_name, "return_against")
+    if not return_against:
         return None
-    si = frappe.get_doc("Sales Invoice", cn.return_against)
-    return str(si.posting_date)
+    return str(frappe.db.get_value("Sales Invoice", return_against, "posting_date"))
 
 
 @frappe.whitelist()
@@ -4984,7 +5048,7 @@ def create_clean_credit_note_in_tally(credit_note_name):
             }
 
         # ---------- 2. Ensure all masters exist ----------
-        master_result = create_missing_masters_for_document("Sales Invoice", credit_note_name)
+        master_result = create_missing_masters_for_document("Sales Invoice", credit_note_name, doc=cn)
 
         if not master_result.get("success"):
             error_msg = "Could not create required masters in Tally: " + "; ".join(
@@ -5184,12 +5248,12 @@ def create_clean_credit_note_in_tally(credit_note_name):
 
         # ---------- 6.b Items XML ----------
         items_xml = ""
+        uom_maps = get_uom_maps({item.item_code for item in cn.items if item.qty})
         for item in cn.items:
             if not item.qty:
                 continue
 
-            item_doc = frappe.get_doc("Item", item.item_code)
-            qty_str = qty_display_for_item(item, item_doc)
+            qty_str = qty_display_for_item(item, uom_map=uom_maps[item.item_code])
 
             line_amount = abs(float(item.base_amount or item.amount or 0))
             rate = abs(float(item.base_rate or item.rate or 0))
@@ -5494,16 +5558,19 @@ def queue_sales_invoice_or_return_sync(invoice_name):
     Enqueue Tally sync for Sales Invoice or Credit Note (return).
     Decides which creator to use based on is_return.
     """
-    doc = frappe.get_doc("Sales Invoice", invoice_name)
+    # Single indexed lookup: only submitted invoices return a row
+    is_return = frappe.db.get_value(
+        "Sales Invoice", {"name": invoice_name, "docstatus": 1}, "is_return"
+    )
 
-    if doc.docstatus != 1:
+    if is_return is None:
         return {
             "success": False,
             "error": "Document must be submitted before syncing to Tally",
         }
 
     # Decide target API and prepare correct arguments
-    if getattr(doc, "is_return", 0):
+    if is_return:
         # This is a Credit Note
         method_path = (
             "tally_connect.tally_integration.api.creators."
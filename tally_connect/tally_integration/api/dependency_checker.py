@@ -1265,180 +1265,354 @@
 #         "message": f"Created {len(requests_created)} master creation request(s)"
 #     }
 
+import json
+from dataclasses import asdict, dataclass
+
 import frappe
 from frappe import _
-from tally_connect.tally_integration.utils import check_master_exists
-
-def check_dependencies_for_document(doctype, docname, company):
-    """Check if all dependencies exist in Tally"""
-    missing = []
-    
-    if doctype in ["Sales Order", "Sales Invoice"]:
-        missing = check_sales_invoice_dependencies(docname, doctype, company)
-    elif doctype in ["Purchase Order", "Purchase Invoice"]:
-        missing = check_purchase_invoice_dependencies(docname, doctype, company)
-    
-    return missing
-
-def check_sales_invoice_dependencies(docname, doctype, company):
+from tally_connect.tally_integration.utils import (
+    check_master_exists,
+    check_masters_exist_bulk,
+    get_account_group_names,
+    get_party_account,
+    get_request_cache,
+    get_settings,
+    log_error_once
+)
+
+# Request statuses that still count as "already requested"
+_OPEN_REQUEST_STATUSES = ("Pending Approval", "Approved", "In Progress")
+
+# ERPNext Item Group -> Tally Stock Group
+_ITEM_GROUP_MAPPING = {
+    "Raw Material": "Raw Materials",
+    "Finished Goods": "Finished Products",
+    "Consumables": "Consumables",
+    "Services": "Services"
+}
+
+@dataclass(slots=True)
+class MissingMaster:
+    """A master the document needs that Tally does not have yet"""
+    type: str
+    erpnext_doctype: str | None
+    name: str
+    display_name: str
+    parent: str
+    priority: str = "Normal"
+
+def check_dependencies_for_document(doctype, docname, company, doc=None):
+    """
+    Check if all dependencies exist in Tally
+    Hooks should pass doc=self so the document is not loaded again.
+    
+    Returns:
+        list: Missing masters as dicts [{"type": "Customer", "name": ...}]
+    """
+    return [asdict(m) for m in _collect_missing_masters(doctype, docname, company, doc)]
+
+def _collect_missing_masters(doctype, docname, company, doc=None):
+    """Run the registered checker; returns MissingMaster objects"""
+    checker = _CHECKERS.get(doctype)
+    if not checker:
+        return []
+    
+    return checker(docname, doctype, company, doc=doc)
+
+def register_checker(doctype, fn):
+    """
+    Register a dependency checker for a doctype
+    
+    Args:
+        doctype: ERPNext doctype, e.g. "Delivery Note"
+        fn: fn(docname, doctype, company, doc=None) -> list of MissingMaster
+    """
+    _CHECKERS[doctype] = fn
+
+def check_sales_invoice_dependencies(docname, doctype, company, doc=None):
     """Check dependencies for Sales Invoice/Order"""
-    doc = frappe.get_doc(doctype, docname)
+    return _check_invoice_like(
+        doctype, docname, company,
+        doc=doc,
+        party_field="customer",
+        party_name_field="customer_name",
+        party_type="Customer",
+        party_parent_fn=get_customer_parent_group,
+        tax_ledgers_fn=_get_tax_ledger_names
+    )
+
+def check_purchase_invoice_dependencies(docname, doctype, company, doc=None):
+    """Check dependencies for Purchase Invoice/Order"""
+    return _check_invoice_like(
+        doctype, docname, company,
+        doc=doc,
+        party_field="supplier",
+        party_name_field="supplier_name",
+        party_type="Supplier",
+        party_parent_fn=lambda party, company: "Sundry Creditors"
+    )
+
+def _check_invoice_like(doctype, docname, company, *, party_field, party_name_field,
+                        party_type, party_parent_fn, tax_ledgers_fn=None, doc=None):
+    """
+    Shared dependency check for sales/purchase documents
+    
+    Args:
+        party_field: Link field holding the party (customer/supplier)
+        party_name_field: Field holding the party's display name
+        party_type: ERPNext doctype of the party
+        party_parent_fn: fn(party, company) -> Tally parent group for the ledger
+        tax_ledgers_fn: fn() -> tax ledger names the document's taxes need;
+            only the sales checker passes one (the configured output ledgers)
+        doc: Already-loaded document (from a hook); fetched from cache otherwise
+    """
+    doc = doc or frappe.get_cached_doc(doctype, docname)
     missing = []
-    
-    # Check customer - VERIFY IT EXISTS IN ERPNEXT FIRST
-    customer_exists_erpnext = frappe.db.exists("Customer", doc.customer)
-    
-    if customer_exists_erpnext:
-        result = check_master_exists("Ledger", doc.customer)
-        if not result.get("exists"):
-            missing.append({
-                "type": "Customer",
-                "erpnext_doctype": "Customer",
-                "name": doc.customer,
-                "display_name": doc.customer_name or doc.customer,
-                "parent": get_customer_parent_group(doc.customer, company),
-                "priority": "High"
-            })
-    else:
-        frappe.log_error(
-            f"Customer '{doc.customer}' not found in ERPNext. Cannot create Tally request.",
-            "Dependency Checker - Customer Not Found"
-        )
-    
-    # Check items - VERIFY THEY EXIST IN ERPNEXT
-    for item in doc.items:
-        item_exists_erpnext = frappe.db.exists("Item", item.item_code)
-        
-        if item_exists_erpnext:
-            result = check_master_exists("StockItem", item.item_code)
-            if not result.get("exists"):
-                missing.append({
-                    "type": "Item",
-                    "erpnext_doctype": "Item",
-                    "name": item.item_code,
-                    "display_name": item.item_name or item.item_code,
-                    "parent": get_item_stock_group(item.item_code, company),
-                    "priority": "Normal"
-                })
+    party = doc.get(party_field)
+    item_codes = list(dict.fromkeys(item.item_code for item in doc.get("items") or [] if item.item_code))
+    
+    # Nothing to look up in Tally
+    if not party and not item_codes:
+        return missing
+    
+    tax_ledgers = tax_ledgers_fn() if tax_ledgers_fn and doc.get("taxes") else []
+    
+    # One Tally round-trip per master type instead of one per row
+    exists_map = check_masters_exist_bulk({
+        "Ledger": ([party] if party else []) + tax_ledgers,
+        "StockItem": item_codes
+    })
+    party_missing = bool(party) and not exists_map.get(("Ledger", party))
+    missing_codes = [code for code in item_codes if not exists_map.get(("StockItem", code))]
+    missing_tax_ledgers = [name for name in tax_ledgers if not exists_map.get(("Ledger", name))]
+    
+    # Steady state: everything already synced - no ERPNext lookups at all
+    if not party_missing and not missing_codes and not missing_tax_ledgers:
+        return missing
+    
+    # Check party - VERIFY IT EXISTS IN ERPNEXT FIRST
+    if party_missing:
+        if frappe.db.get_value(party_type, party, "name", cache=True):
+            missing.append(MissingMaster(
+                type=party_type,
+                erpnext_doctype=party_type,
+                name=party,
+                display_name=doc.get(party_name_field) or party,
+                parent=party_parent_fn(party, company),
+                priority="High"
+            ))
         else:
             frappe.log_error(
-                f"Item '{item.item_code}' not found in ERPNext. Cannot create Tally request.",
-                "Dependency Checker - Item Not Found"
+                f"{party_type} '{party}' not found in ERPNext. Cannot create Tally request.",
+                f"Dependency Checker - {party_type} Not Found"
             )
     
-    return missing
-
-def check_purchase_invoice_dependencies(docname, doctype, company):
-    """Check dependencies for Purchase Invoice/Order"""
-    doc = frappe.get_doc(doctype, docname)
-    missing = []
+    # GST invoices need the tax ledgers too; they have no ERPNext source doc
+    for ledger_name in missing_tax_ledgers:
+        missing.append(MissingMaster(
+            type="Tax Ledger",
+            erpnext_doctype=None,
+            name=ledger_name,
+            display_name=ledger_name,
+            parent="Duties & Taxes",
+            priority="High"
+        ))
     
-    # Check supplier
-    supplier_exists_erpnext = frappe.db.exists("Supplier", doc.supplier)
-    
-    if supplier_exists_erpnext:
-        result = check_master_exists("Ledger", doc.supplier)
-        if not result.get("exists"):
-            missing.append({
-                "type": "Supplier",
-                "erpnext_doctype": "Supplier",
-                "name": doc.supplier,
-                "display_name": doc.supplier_name or doc.supplier,
-                "parent": "Sundry Creditors",
-                "priority": "High"
-            })
+    if not missing_codes:
+        return missing
     
-    # Check items
-    for item in doc.items:
-        item_exists_erpnext = frappe.db.exists("Item", item.item_code)
+    # Check items - VERIFY THEY EXIST IN ERPNEXT
+    # One query for the missing subset: only existing items come back
+    item_groups = get_item_groups(missing_codes)
+    item_names = {item.item_code: item.item_name for item in doc.get("items")}
+    settings = get_settings()
+    
+    for item_code in missing_codes:
+        if item_code not in item_groups:
+            frappe.log_error(
+                f"Item '{item_code}' not found in ERPNext. Cannot create Tally request.",
+                "Dependency Checker - Item Not Found"
+            )
+            continue
         
-        if item_exists_erpnext:
-            result = check_master_exists("StockItem", item.item_code)
-            if not result.get("exists"):
-                missing.append({
-                    "type": "Item",
-                    "erpnext_doctype": "Item",
-                    "name": item.item_code,
-                    "display_name": item.item_name or item.item_code,
-                    "parent": get_item_stock_group(item.item_code, company),
-                    "priority": "Normal"
-                })
+        missing.append(MissingMaster(
+            type="Item",
+            erpnext_doctype="Item",
+            name=item_code,
+            display_name=item_names.get(item_code) or item_code,
+            parent=_resolve_stock_group(item_groups[item_code], settings)
+        ))
     
     return missing
 
+def _get_tax_ledger_names():
+    """Configured CGST/SGST/IGST ledger names, skipping blanks"""
+    settings = get_settings()
+    return [
+        name for name in (
+            settings.get("cgst_ledger_name"),
+            settings.get("sgst_ledger_name"),
+            settings.get("igst_ledger_name")
+        ) if name
+    ]
+
+# doctype -> fn(docname, doctype, company, doc=None); extend via register_checker
+_CHECKERS = {
+    "Sales Order": check_sales_invoice_dependencies,
+    "Sales Invoice": check_sales_invoice_dependencies,
+    "Purchase Order": check_purchase_invoice_dependencies,
+    "Purchase Invoice": check_purchase_invoice_dependencies,
+}
+
 def get_customer_parent_group(customer_name, company):
-    """Get parent group for customer"""
+    """Get parent group for customer (memoized for the current request)"""
+    cache = get_request_cache("tally_dep_customer_parent_group")
+    key = (customer_name, company)
+    if key not in cache:
+        cache[key] = _get_customer_parent_group(customer_name, company)
+    return cache[key]
+
+def _get_customer_parent_group(customer_name, company):
+    default = "Sundry Debtors"
+    if not customer_name:
+        return default
+    
     try:
-        from tally_connect.tally_integration.utils import get_settings
-        
-        customer = frappe.get_doc("Customer", customer_name)
-        for account in customer.accounts:
-            if account.company == company and account.account:
-                parent_account = frappe.db.get_value("Account", account.account, "parent_account")
-                if parent_account:
-                    return frappe.db.get_value("Account", parent_account, "account_name")
+        # Only the company's Party Account row - not the whole Customer doc
+        account = get_party_account("Customer", customer_name, company)
+        names = get_account_group_names(account) if account else None
+        if names and names.parent_name:
+            return names.parent_name
         
-        settings = get_settings()
-        return settings.get("default_customer_ledger") or "Sundry Debtors"
-    except:
-        return "Sundry Debtors"
-
-def get_item_stock_group(item_code, company):
-    """Get stock group for item"""
+        return get_settings().get("default_customer_ledger") or default
+    except Exception as e:
+        log_error_once(
+            f"Error getting customer parent group for {customer_name}: {e}",
+            "Dependency Checker - Parent Group"
+        )
+        return default
+
+def get_item_groups(item_codes):
+    """
+    Fetch item_group for many items in one query: {item_code: item_group}
+    Items missing from ERPNext are absent from the result.
+    """
+    if not item_codes:
+        return {}
+    
+    # Plain db.get_values: no list-query layer, just the SELECT
+    return dict(frappe.db.get_values(
+        "Item",
+        {"name": ["in", list(set(item_codes))]},
+        ["name", "item_group"]
+    ))
+
+def get_item_stock_group(item_code, company, item_group=None):
+    """
+    Get stock group for item (memoized for the current request)
+    Pass item_group to skip loading the Item.
+    """
+    cache = get_request_cache("tally_dep_item_stock_group")
+    key = (item_code, company)
+    if key not in cache:
+        cache[key] = _get_item_stock_group(item_code, item_group)
+    return cache[key]
+
+def _get_item_stock_group(item_code, item_group=None):
     try:
-        from tally_connect.tally_integration.utils import get_settings
-        
-        item = frappe.get_doc("Item", item_code)
-        group_mapping = {
-            "Raw Material": "Raw Materials",
-            "Finished Goods": "Finished Products",
-            "Consumables": "Consumables",
-            "Services": "Services"
-        }
-        
-        if item.item_group in group_mapping:
-            return group_mapping[item.item_group]
+        if item_group is None:
+            # Returns None cleanly for unknown items
+            item_group = frappe.db.get_value("Item", item_code, "item_group")
         
-        settings = get_settings()
-        return settings.get("default_inventory_stock_group") or "Primary"
-    except:
+        return _resolve_stock_group(item_group)
+    except Exception as e:
+        log_error_once(
+            f"Error getting stock group for {item_code}: {e}",
+            "Dependency Checker - Stock Group"
+        )
         return "Primary"
 
+def _resolve_stock_group(item_group, settings=None):
+    """
+    Tally stock group for an ERPNext item group
+    Mapped groups return without touching settings; pass settings from a
+    loop so the unmapped fallback is a single attribute read.
+    """
+    if item_group in _ITEM_GROUP_MAPPING:
+        return _ITEM_GROUP_MAPPING[item_group]
+    
+    settings = settings or get_settings()
+    return settings.get("default_inventory_stock_group") or "Primary"
+
+def _compact_missing_master(master):
+    """Drop keys the client can derive: display_name == name, erpnext_doctype == type, Normal priority"""
+    compact = {"type": master.type, "name": master.name, "parent": master.parent}
+    if master.display_name and master.display_name != master.name:
+        compact["display_name"] = master.display_name
+    if master.erpnext_doctype != master.type:
+        compact["erpnext_doctype"] = master.erpnext_doctype
+    if master.priority != "Normal":
+        compact["priority"] = master.priority
+    return compact
+
 @frappe.whitelist()
 def check_dependencies_and_show_missing(doctype, docname, company):
-    """API endpoint for UI button"""
-    missing = check_dependencies_for_document(doctype, docname, company)
+    """
+    API endpoint for UI button
+    Returns a compact payload; sales_order.js expands the defaults back.
+    Use check_dependencies_for_document for the full structure.
+    """
+    missing = [_compact_missing_master(m) for m in _collect_missing_masters(doctype, docname, company)]
     
     return {
-        "has_missing": len(missing) > 0,
-        "missing_count": len(missing),
-        "missing_masters": missing
+        "missing": missing,
+        "count": len(missing)
     }
 
 @frappe.whitelist()
 def create_requests_for_missing_masters(doctype, docname, company, missing_masters_json):
     """Create requests for missing masters - WITH ERROR HANDLING"""
-    import json
-    
     missing_masters = json.loads(missing_masters_json)
     requests_created = []
     errors = []
     
+    # Open requests for every master in one query instead of one per master
+    names = [master.get("name") for master in missing_masters if master.get("name")]
+    existing_map = {}
+    if names:
+        existing_map = {
+            row.erpnext_document: row.name
+            for row in frappe.get_all(
+                "Tally Master Creation Request",
+                filters={
+                    "erpnext_document": ["in", names],
+                    "status": ["in", _OPEN_REQUEST_STATUSES]
+                },
+                fields=["name", "erpnext_document"]
+            )
+        }
+    
+    inserted = False
+    
+    # Same for every request in this batch
+    requested_by = frappe.session.user
+    reason = f"Required for {doctype}: {docname}"
+    
     for master in missing_masters:
-        # Check if request already exists
-        existing = frappe.db.exists(
-            "Tally Master Creation Request",
-            {
-                "erpnext_document": master["name"],
-                "status": ["in", ["Pending Approval", "Approved", "In Progress"]]
-            }
-        )
+        # Tax ledgers have no request workflow - they are set up by the Tally admin
+        if master.get("type") == "Tax Ledger":
+            errors.append(f"{master['name'][:50]} - create this tax ledger in Tally manually")
+            continue
         
+        # Check if request already exists
+        existing = existing_map.get(master.get("name"))
         if existing:
             requests_created.append(existing)
             continue
         
-        # Create new request
+        # Create new request - inside a savepoint so one failed insert
+        # is rolled back on its own instead of poisoning the batch
+        frappe.db.savepoint("tally_master_request")
         try:
             # Truncate long names (max 140 chars for Title field)
             master_name_display = master["display_name"]
@@ -1457,13 +1631,20 @@ def create_requests_for_missing_masters(doctype, docname, company, missing_maste
                 "linked_transaction_doctype": doctype,
                 "priority": master.get("priority", "Normal"),
                 "status": "Pending Approval",
-                "requested_by": frappe.session.user,
-                "reason_for_creation": f"Required for {doctype}: {docname}"
+                "requested_by": requested_by,
+                "reason_for_creation": reason
             })
+            # Links were resolved by the dependency check that produced this
+            # list; insert() still runs before/after_insert (snapshot, assignment,
+            # realtime notification), which bulk_insert/db_insert would skip
+            request.flags.ignore_links = True
             request.insert(ignore_permissions=True)
             requests_created.append(request.name)
+            existing_map[master["name"]] = request.name
+            inserted = True
             
         except Exception as e:
+            frappe.db.rollback(save_point="tally_master_request")
             error_msg = str(e)
             frappe.log_error(
                 f"Failed to create request for {master.get('display_name', 'Unknown')}:\n{error_msg}",
@@ -1471,7 +1652,9 @@ def create_requests_for_missing_masters(doctype, docname, company, missing_maste
             )
             errors.append(f"{master.get('display_name', 'Unknown')[:50]} - {error_msg[:100]}")
     
-    frappe.db.commit()
+    # Nothing written (all duplicates or all failed) - nothing to commit
+    if inserted:
+        frappe.db.commit()
     
     # Build message
     if requests_created:
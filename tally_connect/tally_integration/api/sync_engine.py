@@ -1,9 +1,55 @@
+import io
+import json
+import logging
+from xml.etree.ElementTree import ParseError, iterparse
+
+import frappe
+from tally_connect.tally_integration.utils import (
+    escape_xml,
+    format_date_for_tally,
+    get_request_cache,
+    get_settings,
+    get_tally_session,
+)
+
+
+logger = frappe.logger("tally_sync")
+
+# Fixed envelope around every voucher import
+_XML_PROLOGUE = (
+    '<?xml version="1.0" encoding="UTF-8"?>',
+    '<ENVELOPE>',
+    ' <HEADER><TALLYREQUEST>Import Data</TALLYREQUEST></HEADER>',
+    ' <BODY><IMPORTDATA>',
+    '  <REQUESTDESC><REPORTNAME>Vouchers</REPORTNAME>'
+)
+_XML_EPILOGUE = ('  </TALLYMESSAGE>', '  </REQUESTDATA>', ' </IMPORTDATA>', '</BODY>', '</ENVELOPE>')
+
+# XML section order; categories not listed here go last
+_CATEGORY_ORDER = {
+    category: index
+    for index, category in enumerate(
+        ["Master", "Transaction", "Header", "Inventory", "Ledger", "Tax", "Custom", "General"]
+    )
+}
+
+# Item row fields that inventory mappings may read
+_ITEM_ROW_FIELDS = frozenset({"item_code", "item_name", "qty", "rate", "amount"})
+
+
+def _tally_url():
+    """Tally URL from settings, resolved once per request"""
+    cache = get_request_cache("tally_sync_engine")
+    if "tally_url" not in cache:
+        cache["tally_url"] = get_settings().tally_url
+    return cache["tally_url"]
+
+
 def get_advanced_mappings(doc, voucher_type=None):
     """Get advanced mappings from ERPNext Tally Mapping DocType"""
     filters = {
-        "doctype": doc.doctype,  # ERPNext DocType name
-        "active": "Yes",         # Match CSV "Yes"
-        "is_required": ["in", ["Yes", "No"]]  # Both required & optional
+        "document_type": doc.doctype,  # ERPNext DocType name
+        "is_active": 1                 # Required & optional mappings alike
     }
     
     # Company filter
@@ -12,62 +58,89 @@ def get_advanced_mappings(doc, voucher_type=None):
     
     # Voucher type filter
     if voucher_type:
-        filters["apply_for_voucher_type"] = voucher_type
+        filters["apply_for_voucher_type"] = ["in", [voucher_type, "All"]]
     
     # ✅ FIXED: Use correct DocType name
+    # Only the columns the XML builder reads (checked against the doctype JSON)
     mappings = frappe.get_all("ERPNext Tally Mapping", filters=filters,
-        fields=["*"],
+        fields=[
+            "name", "mapping_category", "erpnext_field", "tally_xml_tag",
+            "transformation_type", "transformation_json", "default_value",
+            "sequence_order", "is_required"
+        ],
         order_by="sequence_order asc"
     )
     
-    # Group by category for XML generation
+    # Group by category for XML generation; rows arrive sorted by
+    # sequence_order and appending keeps that order within each category
     categorized = {}
     for mapping in mappings:
-        category = mapping.category or "General"
+        mapping._transform_fn = _compile_transformation(mapping)
+        category = mapping.mapping_category or "General"
         if category not in categorized:
             categorized[category] = []
         categorized[category].append(mapping)
     
-    print(f"📋 Loaded {len(mappings)} mappings from ERPNext Tally Mapping")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Loaded %d mappings from ERPNext Tally Mapping", len(mappings))
     return categorized
 
 
-def apply_advanced_transformation(doc, mapping):
-    """Apply transformation based on transformation_type and JSON config"""
-    field_value = doc.get(mapping.erpnext_field)
-    
-    # Apply transformation_type logic
-    transformation_type = mapping.transformation_type or "direct"
-    
+def _build_concat_fn(config):
+    """Precompute a concat config into (is_field, key_or_literal) parts"""
+    parts = [
+        (True, part[6:]) if part.startswith("field:") else (False, part)
+        for part in config.get("parts", [])
+    ]
+
+    def concat(doc):
+        values = (doc.get(key) if is_field else key for is_field, key in parts)
+        return "".join(str(v) for v in values if v)
+
+    return concat
+
+
+def _compile_transformation(mapping):
+    """
+    Build the transformation callable for a mapping once, at load time.
+
+    Returns:
+        Function taking the document and returning the transformed value
+    """
+    field = mapping.erpnext_field
+    default_value = mapping.default_value
+    # The doctype's Select options are upper case (DIRECT, DATE_FORMAT, ...)
+    transformation_type = (mapping.transformation_type or "direct").lower()
+
     if transformation_type == "direct":
-        return field_value
-    
+        return lambda doc: doc.get(field)
+
     elif transformation_type == "escape_xml":
-        return escape_xml(field_value)
-    
+        return lambda doc: escape_xml(doc.get(field))
+
     elif transformation_type == "date_format":
-        return format_date_for_tally(field_value)
-    
+        return lambda doc: format_date_for_tally(doc.get(field))
+
     elif transformation_type == "negative":
-        return -1 * float(field_value or 0)
-    
-    elif transformation_type == "json_config" and mapping.transformation_config:
+        return lambda doc: -1 * float(doc.get(field) or 0)
+
+    elif transformation_type == "json_config" and mapping.transformation_json:
         try:
-            config = json.loads(mapping.transformation_config)
+            config = json.loads(mapping.transformation_json)
             # Handle complex transformations (regex, concat, conditional)
             if config.get("type") == "concat":
-                parts = []
-                for part in config.get("parts", []):
-                    if part.startswith("field:"):
-                        parts.append(doc.get(part[6:]))
-                    else:
-                        parts.append(part)
-                return "".join(str(p) for p in parts if p)
-        except:
+                return _build_concat_fn(config)
+        except Exception:
             pass
-    
+
     # Fallback to default value
-    return mapping.default_value or field_value
+    return lambda doc: default_value or doc.get(field)
+
+
+def apply_advanced_transformation(doc, mapping):
+    """Apply transformation based on transformation_type and JSON config"""
+    transform = mapping.get("_transform_fn") or _compile_transformation(mapping)
+    return transform(doc)
 
 @frappe.whitelist()
 def sync_sales_invoice_to_tally(invoice_name, voucher_type="Sales"):
@@ -77,17 +150,23 @@ def sync_sales_invoice_to_tally(invoice_name, voucher_type="Sales"):
         
         # Get categorized mappings
         mappings = get_advanced_mappings(invoice, voucher_type)
-        print(f"📋 Loaded mappings: {mappings.keys()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Loaded mapping categories: %s", list(mappings))
         
         # Build XML by category sequence
         xml_parts = build_xml_by_category(invoice, mappings)
         
         # Send to Tally
-        tally_url = frappe.db.get_single_value("Tally Connect Settings", "tally_url")
-        response = frappe.request.post(tally_url, data=xml_parts, 
-                                     headers={"Content-Type": "text/xml; charset=utf-8"})
+        tally_url = _tally_url()
+        response = get_tally_session().post(
+            tally_url,
+            data=xml_parts.encode("utf-8"),
+            headers={"Content-Type": "text/xml; charset=utf-8"},
+            timeout=30
+        )
         
-        if "<CREATED>1</CREATED>" in response.text:
+        created, tally_error = _read_import_result(response.content)
+        if created:
             frappe.db.set_value("Sales Invoice", invoice.name, {
                 "custom_tally_synced": 1,
                 "custom_tally_voucher_number": invoice.name,
@@ -97,58 +176,77 @@ def sync_sales_invoice_to_tally(invoice_name, voucher_type="Sales"):
             frappe.db.commit()
             return {"success": True, "voucher_number": invoice.name}
         else:
-            return {"success": False, "error": extract_tally_error(response.text)}
+            return {"success": False, "error": tally_error or "Tally did not create the voucher"}
             
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+
+def _read_import_result(content):
+    """
+    Stream a Tally import response for the CREATED count and first LINEERROR
+    Stops as soon as a voucher is reported created.
+    
+    Returns:
+        tuple: (created count, error text or None)
+    """
+    created = 0
+    error = None
+    try:
+        for _, element in iterparse(io.BytesIO(content), events=("end",)):
+            if element.tag == "CREATED":
+                created = int((element.text or "").strip() or 0)
+                if created:
+                    break
+            elif element.tag == "LINEERROR" and error is None:
+                error = (element.text or "").strip()
+            element.clear()
+    except (ParseError, ValueError):
+        # Tally sometimes returns control characters that aren't valid XML
+        created = int(b"<CREATED>1</CREATED>" in content)
+    return created, error
+
 def build_xml_by_category(doc, mappings):
     """Build XML following category sequence order"""
-    category_order = ["Header", "Inventory", "Ledger", "Tax", "General"]
-    
-    xml_parts = [
-        '<?xml version="1.0" encoding="UTF-8"?>',
-        '<ENVELOPE>',
-        ' <HEADER><TALLYREQUEST>Import Data</TALLYREQUEST></HEADER>',
-        ' <BODY><IMPORTDATA>',
-        '  <REQUESTDESC><REPORTNAME>Vouchers</REPORTNAME>'
-    ]
+    xml_parts = list(_XML_PROLOGUE)
     
     # Add company from Company settings
-    company_doc = frappe.get_doc("Company", doc.company)
+    company_doc = frappe.get_cached_doc("Company", doc.company)
     xml_parts.append(f'   <STATICVARIABLES><SVCURRENTCOMPANY>{escape_xml(company_doc.custom_tally_company_name)}</SVCURRENTCOMPANY></STATICVARIABLES>')
     
     xml_parts.extend(['  </REQUESTDESC>', '  <REQUESTDATA><TALLYMESSAGE xmlns:UDF="TallyUDF">'])
     
-    # Process categories in order
-    for category in category_order:
-        if category in mappings:
-            for mapping in mappings[category]:
-                value = apply_advanced_transformation(doc, mapping)
-                if value is not None:
-                    escaped_value = escape_xml(str(value))
-                    xml_parts.append(f'   <{mapping.tally_xml_tag}>{escaped_value}</{mapping.tally_xml_tag}>')
+    # Process only the categories that have mappings, in section order
+    for category in sorted(mappings, key=lambda c: _CATEGORY_ORDER.get(c, len(_CATEGORY_ORDER))):
+        for mapping in mappings[category]:
+            value = apply_advanced_transformation(doc, mapping)
+            if value is not None:
+                escaped_value = escape_xml(str(value))
+                xml_parts.append(f'   <{mapping.tally_xml_tag}>{escaped_value}</{mapping.tally_xml_tag}>')
     
     # Add inventory items (special handling)
     if "Inventory" in mappings:
         items_xml = build_items_from_mappings(doc, mappings["Inventory"])
         xml_parts.append(items_xml)
     
-    xml_parts.extend(['  </TALLYMESSAGE>', '  </REQUESTDATA>', ' </IMPORTDATA>', '</BODY>', '</ENVELOPE>'])
+    xml_parts.extend(_XML_EPILOGUE)
     
     return "\n".join(xml_parts)
 
 def build_items_from_mappings(doc, item_mappings):
     """Build inventory items using item mappings"""
-    items_xml = ""
+    # Collect fragments and join once - repeated str += is quadratic
+    parts = []
+    # Special handling for child table fields - filter the mappings once
+    active = [
+        (mapping.tally_xml_tag, mapping.erpnext_field)
+        for mapping in item_mappings
+        if mapping.erpnext_field in _ITEM_ROW_FIELDS
+    ]
     for item_row in doc.items:
         # For each item row, apply item mappings
-        item_xml = "   <ALLINVENTORYENTRIES.LIST>"
-        for mapping in item_mappings:
-            if mapping.erpnext_field in ["item_code", "item_name", "qty", "rate", "amount"]:
-                # Special handling for child table fields
-                value = item_row.get(mapping.erpnext_field) if hasattr(item_row, mapping.erpnext_field) else ""
-                item_xml += f"\n    <{mapping.tally_xml_tag}>{escape_xml(str(value))}</{mapping.tally_xml_tag}>"
-        item_xml += "\n   </ALLINVENTORYENTRIES.LIST>"
-        items_xml += item_xml
-    return items_xml
+        parts.append("   <ALLINVENTORYENTRIES.LIST>")
+        for tag, field in active:
+            parts.append(f"\n    <{tag}>{escape_xml(str(item_row.get(field)))}</{tag}>")
+        parts.append("\n   </ALLINVENTORYENTRIES.LIST>")
+    return "".join(parts)
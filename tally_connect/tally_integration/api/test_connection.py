@@ -273,7 +273,7 @@ def test_all_groups():
     
     from tally_connect.tally_integration.utils import (
         get_settings,
-        check_master_exists
+        check_masters_bulk
     )
     
     try:
@@ -301,19 +301,30 @@ def test_all_groups():
                 "groups_checked": 0
             }
         
+        # One Group collection export for all of them
+        errors = {}
+        existing = check_masters_bulk([("Group", group["name"]) for group in groups_to_check], errors=errors)
+        
+        if errors:
+            return {
+                "test": "All Groups Validation",
+                "success": False,
+                "error": errors.get("Group"),
+                "groups_checked": 0
+            }
+        
         results = []
         all_exist = True
         
         for group in groups_to_check:
-            check_result = check_master_exists("Group", group["name"])
+            exists = existing.get(("Group", group["name"]), False)
             results.append({
                 "name": group["name"],
                 "purpose": group["purpose"],
-                "exists": check_result.get("exists", False),
-                "success": check_result.get("success", False)
+                "exists": exists
             })
             
-            if not check_result.get("exists"):
+            if not exists:
                 all_exist = False
         
         missing_groups = [r for r in results if not r["exists"]]
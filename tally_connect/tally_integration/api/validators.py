@@ -1,159 +1,3 @@
-# # """
-# # Tally Validator APIs
-# # Combined validation functions
-# # """
-
-import frappe
-from tally_connect.tally_integration.api.checkers import (
-    check_ledger_exists,
-    check_group_exists,
-    check_stock_item_exists
-)
-from tally_connect.tally_integration.utils import get_settings
-
-from tally_connect.tally_integration.api.creators import (
-    create_customer_ledger_in_tally,
-    create_stock_group_in_tally,
-    create_stock_item_in_tally,
-    create_generic_ledger_in_tally,
-)
-# # @frappe.whitelist()
-# # def validate_customer_for_tally(customer_name):
-# #     """
-# #     Validate if customer is ready to sync
-    
-# #     Returns:
-# #         dict: {
-# #             "valid": bool,
-# #             "errors": [],
-# #             "warnings": []
-# #         }
-# #     """
-# #     settings = get_settings()
-# #     errors = []
-# #     warnings = []
-    
-# #     # Check parent group exists
-# #     parent_group = settings.default_customer_ledger or "Sundry Debtors"
-# #     group_check = check_group_exists(parent_group)
-    
-# #     if not group_check["exists"]:
-# #         errors.append(f"Parent group '{parent_group}' not found in Tally")
-    
-# #     # Check if customer already exists
-# #     ledger_check = check_ledger_exists(customer_name)
-# #     if ledger_check["exists"]:
-# #         warnings.append(f"Customer already exists in Tally")
-    
-# #     return {
-# #         "valid": len(errors) == 0,
-# #         "errors": errors,
-# #         "warnings": warnings
-# #     }
-
-
-# # @frappe.whitelist()
-# # def validate_item_for_tally(item_code):
-# #     """Validate if item is ready to sync"""
-# #     settings = get_settings()
-# #     errors = []
-# #     warnings = []
-    
-# #     # Check stock group
-# #     stock_group = settings.default_inventory_stock_group or "Primary"
-# #     group_check = check_group_exists(stock_group)
-    
-# #     if not group_check["exists"]:
-# #         errors.append(f"Stock group '{stock_group}' not found in Tally")
-    
-# #     return {
-# #         "valid": len(errors) == 0,
-# #         "errors": errors,
-# #         "warnings": warnings
-# #     }
-
-
-# # @frappe.whitelist()
-# # def validate_invoice_for_tally(invoice_name):
-# #     """Comprehensive validation for invoice"""
-# #     # TODO: Implement full invoice validation
-# #     return {
-# #         "valid": False,
-# #         "errors": ["Not implemented yet"],
-# #         "warnings": []
-# #     }
-# """
-# Tally Validator APIs
-# Combined validation functions
-# """
-
-import frappe
-from tally_connect.tally_integration.api.checkers import (
-    check_ledger_exists,
-    check_group_exists,
-    check_stock_item_exists
-)
-from tally_connect.tally_integration.utils import get_settings
-
-
-#     @frappe.whitelist()
-#     def validate_customer_for_tally(customer_name):
-#         """
-#         Validate if customer is ready to sync
-        
-#         Returns:
-#             dict: {"valid": bool, "errors": [...], "warnings": [...]}
-#         """
-#         settings = get_settings()
-#         errors = []
-#         warnings = []
-        
-#         # Check parent group exists
-#         parent_group = settings.default_customer_ledger or "Sundry Debtors"
-#         group_check = check_group_exists(parent_group)
-        
-#         if not group_check.get("exists"):
-#             errors.append(f"Parent group '{parent_group}' not found in Tally")
-        
-#         # Check if customer already exists
-#         ledger_check = check_ledger_exists(customer_name)
-#         if ledger_check.get("exists"):
-#             warnings.append(f"Customer already exists in Tally")
-        
-#         return {
-#             "valid": len(errors) == 0,
-#             "errors": errors,
-#             "warnings": warnings
-#         }
-
-
-#     @frappe.whitelist()
-#     def validate_item_for_tally(item_code):
-#         """
-#         Validate if item is ready to sync
-#         """
-#         settings = get_settings()
-#         errors = []
-#         warnings = []
-        
-#         # Check stock group
-#         stock_group = settings.default_inventory_stock_group or "Primary"
-#         group_check = check_group_exists(stock_group)
-        
-#         if not group_check.get("exists"):
-#             errors.append(f"Stock group '{stock_group}' not found in Tally")
-        
-#         # Check if item already exists
-#         item_check = check_stock_item_exists(item_code)
-#         if item_check.get("exists"):
-#             warnings.append(f"Item already exists in Tally")
-        
-#         return {
-#             "valid": len(errors) == 0,
-#             "errors": errors,
-#             "warnings": warnings
-#         }
-
 """
 Tally Validator APIs
 Combined validation + sync functions for:
@@ -162,7 +6,11 @@ Combined validation + sync functions for:
 - Sales Invoice & Credit Note: validate masters, create missing, build XML, push
 """
 
+import json
+import re
+
 import frappe
+from frappe.utils import getdate
 
 from tally_connect.tally_integration.api.checkers import (
     check_ledger_exists,
@@ -176,16 +24,30 @@ from tally_connect.tally_integration.api.creators import (
     create_supplier_ledger_in_tally,
     create_stock_group_in_tally,
     create_stock_item_in_tally,
+    create_generic_ledger_in_tally,
 )
 
 from tally_connect.tally_integration.utils import (
     get_settings,
     create_sync_log,
     send_xml_to_tally,
+    check_masters_bulk,
+    check_masters_exist_bulk,
+    escape_xml,
 )
 
 
 
+# Validator messages, built once at import
+_ERR_GROUP_MISSING = "Parent group '{}' not found in Tally".format
+_ERR_STOCK_GROUP_MISSING = "Stock group '{}' not found in Tally".format
+_WARN_CUSTOMER_EXISTS = "Customer already exists in Tally"
+_WARN_ITEM_EXISTS = "Item already exists in Tally"
+
+# Optional custom field: set once every master of a document is in Tally
+_MASTERS_VERIFIED_FIELD = "custom_tally_masters_verified"
+
+
 # ==================== BASIC MASTER VALIDATION (EXISTING) ====================
 
 @frappe.whitelist()
@@ -196,26 +58,31 @@ def validate_customer_for_tally(customer_name):
     Returns:
         dict: {"valid": bool, "errors": [...], "warnings": [...]}
     """
+    # Already pushed by the ledger creator - nothing to ask Tally
+    if _is_tally_synced("Customer", customer_name):
+        return {"valid": True, "errors": (), "warnings": [_WARN_CUSTOMER_EXISTS]}
+
     settings = get_settings()
-    errors = []
-    warnings = []
+    # Lists are only created once there is something to report
+    errors = warnings = None
 
-    # Check parent group exists
     parent_group = settings.default_customer_ledger or "Sundry Debtors"
-    group_check = check_group_exists(parent_group)
 
-    if not group_check.get("exists"):
-        errors.append(f"Parent group '{parent_group}' not found in Tally")
+    # Group and ledger collections are fetched concurrently in one call
+    exists_map = check_masters_bulk([("Group", parent_group), ("Ledger", customer_name)])
+
+    # Check parent group exists
+    if not exists_map.get(("Group", parent_group)):
+        errors = [_ERR_GROUP_MISSING(parent_group)]
 
     # Check if customer already exists
-    ledger_check = check_ledger_exists(customer_name)
-    if ledger_check.get("exists"):
-        warnings.append("Customer already exists in Tally")
+    if exists_map.get(("Ledger", customer_name)):
+        warnings = [_WARN_CUSTOMER_EXISTS]
 
     return {
-        "valid": len(errors) == 0,
-        "errors": errors,
-        "warnings": warnings,
+        "valid": errors is None,
+        "errors": errors or (),
+        "warnings": warnings or (),
     }
 
 
@@ -224,29 +91,210 @@ def validate_item_for_tally(item_code):
     """
     Validate if item is ready to sync.
     """
+    # Already pushed by the stock item creator - nothing to ask Tally
+    if _is_tally_synced("Item", item_code):
+        return {"valid": True, "errors": (), "warnings": [_WARN_ITEM_EXISTS]}
+
     settings = get_settings()
-    errors = []
-    warnings = []
+    # Lists are only created once there is something to report
+    errors = warnings = None
 
-    # Check stock group
     stock_group = settings.default_inventory_stock_group or "Primary"
-    group_check = check_group_exists(stock_group)
 
-    if not group_check.get("exists"):
-        errors.append(f"Stock group '{stock_group}' not found in Tally")
+    # Stock group and stock item collections are fetched concurrently
+    exists_map = check_masters_bulk([("StockGroup", stock_group), ("StockItem", item_code)])
+
+    # Check stock group
+    if not exists_map.get(("StockGroup", stock_group)):
+        errors = [_ERR_STOCK_GROUP_MISSING(stock_group)]
 
     # Check if item already exists
-    item_check = check_stock_item_exists(item_code)
-    if item_check.get("exists"):
-        warnings.append("Item already exists in Tally")
+    if exists_map.get(("StockItem", item_code)):
+        warnings = [_WARN_ITEM_EXISTS]
 
     return {
-        "valid": len(errors) == 0,
-        "errors": errors,
-        "warnings": warnings,
+        "valid": errors is None,
+        "errors": errors or (),
+        "warnings": warnings or (),
     }
 
 
+@frappe.whitelist()
+def validate_customers_for_tally(customer_names):
+    """
+    Validate many customers with one Tally lookup per master type.
+
+    Args:
+        customer_names: JSON array of names or Python list
+
+    Returns:
+        dict: {customer_name: {"valid": bool, "errors": [...], "warnings": [...]}}
+    """
+    if isinstance(customer_names, str):
+        customer_names = json.loads(customer_names)
+
+    settings = get_settings()
+    parent_group = settings.default_customer_ledger or "Sundry Debtors"
+
+    return _validate_many(
+        "Customer",
+        customer_names,
+        "Ledger",
+        ("Group", parent_group),
+        _ERR_GROUP_MISSING(parent_group),
+        _WARN_CUSTOMER_EXISTS,
+    )
+
+
+@frappe.whitelist()
+def validate_items_for_tally(item_codes):
+    """
+    Validate many items with one Tally lookup per master type.
+
+    Args:
+        item_codes: JSON array of item codes or Python list
+
+    Returns:
+        dict: {item_code: {"valid": bool, "errors": [...], "warnings": [...]}}
+    """
+    if isinstance(item_codes, str):
+        item_codes = json.loads(item_codes)
+
+    settings = get_settings()
+    stock_group = settings.default_inventory_stock_group or "Primary"
+
+    return _validate_many(
+        "Item",
+        item_codes,
+        "StockItem",
+        ("StockGroup", stock_group),
+        _ERR_STOCK_GROUP_MISSING(stock_group),
+        _WARN_ITEM_EXISTS,
+    )
+
+
+@frappe.whitelist()
+def validate_invoice_for_tally(invoice_name):
+    """
+    Validate that every master a Sales Invoice references exists in Tally.
+
+    Customer ledger, stock items, their stock groups and the configured
+    sales / GST / round-off ledgers are all resolved in one bulk lookup.
+
+    Returns:
+        dict: {"valid": bool, "errors": [...], "warnings": [...]}
+    """
+    customer = frappe.db.get_value("Sales Invoice", invoice_name, "customer")
+    if not customer:
+        return {"valid": False, "errors": [f"Sales Invoice '{invoice_name}' not found"], "warnings": ()}
+
+    settings = get_settings()
+    items = frappe.get_all(
+        "Sales Invoice Item",
+        filters={"parent": invoice_name, "parenttype": "Sales Invoice"},
+        fields=["item_code", "item_name", "item_group"],
+        order_by="idx asc",
+    )
+
+    # Same names the master creators use
+    stock_items = {}
+    stock_groups = {}
+    default_group = settings.default_inventory_stock_group or "Primary"
+    for row in items:
+        stock_items.setdefault(row.item_name or row.item_code, row.item_code)
+        stock_groups.setdefault(row.item_group or default_group, row.item_code)
+
+    ledgers = {
+        customer: "Customer",
+        settings.sales_ledger_name or "SALES A/C": "Sales",
+        settings.cgst_ledger_name or "CGST": "CGST",
+        settings.sgst_ledger_name or "SGST": "SGST",
+        settings.igst_ledger_name or "IGST": "IGST",
+        settings.round_off_ledger_name or "Round Off": "Round Off",
+    }
+
+    exists_map = check_masters_exist_bulk({
+        "Ledger": list(ledgers),
+        "StockItem": list(stock_items),
+        "StockGroup": list(stock_groups),
+    })
+
+    errors = [
+        f"{kind} ledger '{ledger}' not found in Tally"
+        for ledger, kind in ledgers.items()
+        if not exists_map.get(("Ledger", ledger))
+    ]
+    errors.extend(
+        _ERR_STOCK_GROUP_MISSING(group)
+        for group in stock_groups
+        if not exists_map.get(("StockGroup", group))
+    )
+    errors.extend(
+        f"Item '{item_code}' not found in Tally as '{stock_item}'"
+        for stock_item, item_code in stock_items.items()
+        if not exists_map.get(("StockItem", stock_item))
+    )
+
+    return {
+        "valid": not errors,
+        "errors": errors or (),
+        "warnings": (),
+    }
+
+
+def _validate_many(doctype, names, master_type, group, group_error, exists_warning):
+    """
+    Shared body of the bulk validators: the parent group is checked once
+    for the whole batch, every name in the same bulk call. Names already
+    flagged as synced skip Tally entirely.
+    """
+    synced = _get_tally_synced_names(doctype, names)
+    results = {
+        name: {"valid": True, "errors": (), "warnings": [exists_warning]}
+        for name in synced
+    }
+
+    names = [name for name in names if name not in synced]
+    if not names:
+        return results
+
+    group_type, group_name = group
+    exists_map = check_masters_exist_bulk({group_type: [group_name], master_type: names})
+    group_exists = exists_map.get(group)
+
+    for name in names:
+        errors = () if group_exists else [group_error]
+        warnings = [exists_warning] if exists_map.get((master_type, name)) else ()
+        results[name] = {
+            "valid": bool(group_exists),
+            "errors": errors,
+            "warnings": warnings,
+        }
+
+    return results
+
+
+def _is_tally_synced(doctype, name):
+    """
+    custom_tally_synced flag set by the creators after a successful push.
+    False on sites without the custom field.
+    """
+    if not frappe.get_meta(doctype).has_field("custom_tally_synced"):
+        return False
+    return bool(frappe.db.get_value(doctype, name, "custom_tally_synced", cache=True))
+
+
+def _get_tally_synced_names(doctype, names):
+    """_is_tally_synced for many names in one query"""
+    if not names or not frappe.get_meta(doctype).has_field("custom_tally_synced"):
+        return set()
+    return set(frappe.get_all(
+        doctype,
+        filters={"name": ["in", list(names)], "custom_tally_synced": 1},
+        pluck="name",
+    ))
+
+
 # ==================== SALES ORDER VALIDATION (BLOCK IF MISSING) ====================
 
 def validate_sales_order_masters(doc, method=None):
@@ -263,11 +311,10 @@ def validate_sales_order_masters(doc, method=None):
             missing.append(f"Customer: {doc.customer}")
 
     # Items
-    if hasattr(doc, "items"):
-        for row in doc.items:
-            item_res = check_stock_item_exists(row.item_code)
-            if not item_res.get("exists"):
-                missing.append(f"Item: {row.item_code}")
+    for row in doc.items:
+        item_res = check_stock_item_exists(row.item_code)
+        if not item_res.get("exists"):
+            missing.append(f"Item: {row.item_code}")
 
     if missing:
         msg = "Tally masters missing:\n" + "\n".join(missing)
@@ -276,13 +323,8 @@ def validate_sales_order_masters(doc, method=None):
 
 # ==================== XML HELPERS (SIMPLE V1) ====================
 
-def _build_sales_invoice_xml(doc):
-    """
-    Simple Sales Invoice → Tally Sales voucher XML.
-    V2 can switch to Field Mapping based XML.
-    """
-    posting_date = doc.posting_date.replace("-", "") if doc.posting_date else ""
-    xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+# Static voucher envelope, formatted with only the per-document fields
+_VOUCHER_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
 <ENVELOPE>
   <HEADER>
     <VERSION>1</VERSION>
@@ -299,421 +341,340 @@ def _build_sales_invoice_xml(doc):
     <DATA>
       <TALLYMESSAGE>
         <VOUCHER>
-          <VOUCHERTYPENAME>Sales</VOUCHERTYPENAME>
-          <DATE>{posting_date}</DATE>
-          <PARTYLEDGERNAME>{doc.customer}</PARTYLEDGERNAME>
-          <VOUCHERNUMBER>{doc.name}</VOUCHERNUMBER>
+          <VOUCHERTYPENAME>{voucher_type}</VOUCHERTYPENAME>
+          <DATE>{date}</DATE>
+          <PARTYLEDGERNAME>{party}</PARTYLEDGERNAME>
+          <VOUCHERNUMBER>{vouno}</VOUCHERNUMBER>
           <ISCANCELLED>No</ISCANCELLED>
-"""
-
-    # Inventory lines
-    xml += "          <ALLINVENTORYENTRIES.LIST>\n"
-    for row in doc.items:
-        xml += f"""            <INVENTORYENTRIES.LIST>
-              <STOCKITEMNAME>{row.item_name}</STOCKITEMNAME>
-              <ISDEEMEDPOSITIVE>No</ISDEEMEDPOSITIVE>
-              <RATE>{row.rate}</RATE>
-              <AMOUNT>{row.amount}</AMOUNT>
-              <ACTUALQTY>{row.qty}</ACTUALQTY>
-              <BILLEDQTY>{row.qty}</BILLEDQTY>
+          <ALLINVENTORYENTRIES.LIST>
+""".format
+
+_INVENTORY_LINE = """            <INVENTORYENTRIES.LIST>
+              <STOCKITEMNAME>{name}</STOCKITEMNAME>
+              <ISDEEMEDPOSITIVE>{deemed_positive}</ISDEEMEDPOSITIVE>
+              <RATE>{rate}</RATE>
+              <AMOUNT>{amount}</AMOUNT>
+              <ACTUALQTY>{qty}</ACTUALQTY>
+              <BILLEDQTY>{qty}</BILLEDQTY>
             </INVENTORYENTRIES.LIST>
-"""
-    xml += "          </ALLINVENTORYENTRIES.LIST>\n"
+""".format
 
-    xml += """        </VOUCHER>
+_VOUCHER_FOOTER = """          </ALLINVENTORYENTRIES.LIST>
+        </VOUCHER>
       </TALLYMESSAGE>
     </DATA>
   </BODY>
 </ENVELOPE>"""
-    return xml
 
 
-def _build_credit_note_xml(doc):
+def _tally_date(value):
+    """Date or 'YYYY-MM-DD' string -> Tally's YYYYMMDD ('' when empty)"""
+    return getdate(value).strftime("%Y%m%d") if value else ""
+
+
+def _build_voucher_xml(doc, voucher_type, deemed_positive, rows):
     """
-    Simple Credit Note → Tally Credit Note voucher XML.
+    Fill the voucher envelope for doc with one inventory line per row.
     """
-    posting_date = doc.posting_date.replace("-", "") if doc.posting_date else ""
-    xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<ENVELOPE>
-  <HEADER>
-    <VERSION>1</VERSION>
-    <TALLYREQUEST>Import</TALLYREQUEST>
-    <TYPE>Data</TYPE>
-    <ID>All Vouchers</ID>
-  </HEADER>
-  <BODY>
-    <DESC>
-      <STATICVARIABLES>
-        <IMPORTDUPS>DUPIGNORE</IMPORTDUPS>
-      </STATICVARIABLES>
-    </DESC>
-    <DATA>
-      <TALLYMESSAGE>
-        <VOUCHER>
-          <VOUCHERTYPENAME>Credit Note</VOUCHERTYPENAME>
-          <DATE>{posting_date}</DATE>
-          <PARTYLEDGERNAME>{doc.customer}</PARTYLEDGERNAME>
-          <VOUCHERNUMBER>{doc.name}</VOUCHERNUMBER>
-          <ISCANCELLED>No</ISCANCELLED>
-"""
+    parts = [_VOUCHER_HEADER(
+        voucher_type=voucher_type,
+        date=_tally_date(doc.posting_date),
+        party=escape_xml(doc.customer),
+        vouno=escape_xml(doc.name),
+    )]
+    for row in rows:
+        parts.append(_INVENTORY_LINE(
+            name=escape_xml(row.item_name),
+            deemed_positive=deemed_positive,
+            rate=row.rate,
+            amount=row.amount,
+            qty=row.qty,
+        ))
+    parts.append(_VOUCHER_FOOTER)
+    return "".join(parts)
+
+
+# ==================== SALES INVOICE / CREDIT NOTE FLOW ====================
+
+def _check_once(checked, check_fn, kind, name):
+    """
+    check_fn(name)["exists"], asked at most once per sync call.
+    Rows share groups and items, and every successful create clears the
+    shared existence cache - callers record created masters in checked
+    so later rows don't go back to Tally for them.
+    """
+    key = (kind, name)
+    if key not in checked:
+        checked[key] = bool(check_fn(name).get("exists"))
+    return checked[key]
 
-    xml += "          <ALLINVENTORYENTRIES.LIST>\n"
-    if hasattr(doc, "items"):
-        for row in doc.items:
-            xml += f"""            <INVENTORYENTRIES.LIST>
-              <STOCKITEMNAME>{row.item_name}</STOCKITEMNAME>
-              <ISDEEMEDPOSITIVE>Yes</ISDEEMEDPOSITIVE>
-              <RATE>{row.rate}</RATE>
-              <AMOUNT>{row.amount}</AMOUNT>
-              <ACTUALQTY>{row.qty}</ACTUALQTY>
-              <BILLEDQTY>{row.qty}</BILLEDQTY>
-            </INVENTORYENTRIES.LIST>
-"""
-    xml += "          </ALLINVENTORYENTRIES.LIST>\n"
 
-    xml += """        </VOUCHER>
-      </TALLYMESSAGE>
-    </DATA>
-  </BODY>
-</ENVELOPE>"""
-    return xml
+# check_masters_exist_bulk master type -> _check_once kind
+_CHECK_KINDS = {"Ledger": "ledger", "StockGroup": "stock_group", "StockItem": "stock_item"}
+
+
+def _prefetch_checked(doc, settings, ledgers=()):
+    """
+    Seed a _check_once dict for a voucher with one bulk Tally lookup:
+    the party ledger (plus any extra ledgers) and every row's stock group
+    and stock item, so the row loop only goes back to Tally for names the
+    bulk call skipped.
+    """
+    rows = doc.get("items") or []
+    default_group = settings.default_inventory_stock_group or "Primary"
+    exists_map = check_masters_exist_bulk({
+        "Ledger": [doc.get("customer"), *ledgers],
+        "StockGroup": [row.item_group or default_group for row in rows],
+        "StockItem": [row.item_name for row in rows],
+    })
+    return {(_CHECK_KINDS[master_type], name): exists for (master_type, name), exists in exists_map.items()}
+
+
+def _missing_erpnext_records(doc):
+    """
+    Error message if the voucher's customer or any row's item is not an
+    ERPNext record, else None. Two local queries - lets the sync fail
+    before any Tally round-trip is spent on a bad reference.
+    """
+    if doc.customer and not frappe.db.exists("Customer", doc.customer):
+        return f"Customer not in ERPNext: {doc.customer}"
 
+    item_codes = list(dict.fromkeys(row.item_code for row in doc.get("items") or []))
+    if item_codes:
+        existing = set(frappe.get_all("Item", filters={"name": ["in", item_codes]}, pluck="name"))
+        missing = [code for code in item_codes if code not in existing]
+        if missing:
+            return f"Items not in ERPNext: {', '.join(missing)}"
+
+    return None
+
+
+# Per-flow settings for _validate_and_sync. A credit note is a Sales
+# Invoice with is_return set, logged as "Credit Note" like the creators do.
+_VOUCHER_FLOWS = {
+    "Sales Invoice": {
+        "doctype": "Sales Invoice",
+        "voucher_type": "Sales",
+        "deemed_positive": "No",
+        "operation": "Create Sales Invoice",
+    },
+    "Credit Note": {
+        "doctype": "Sales Invoice",
+        "voucher_type": "Credit Note",
+        "deemed_positive": "Yes",
+        "operation": "Create Credit Note",
+    },
+}
+
+
+def _enqueue_validate_and_sync(flow, name):
+    """Queue _validate_and_sync on the long queue and report it queued"""
+    frappe.enqueue(
+        "tally_connect.tally_integration.api.validators._validate_and_sync",
+        queue="long",
+        timeout=600,
+        now=False,
+        enqueue_after_commit=True,
+        flow=flow,
+        name=name,
+        job_name=f"Tally {flow} Validate & Sync - {name}",
+    )
+
+    return {
+        "success": True,
+        "queued": True,
+        "message": f"Tally sync queued for {name}",
+    }
 
-# ==================== SALES INVOICE FLOW ====================
 
 @frappe.whitelist()
 def validate_and_sync_sales_invoice(invoice_name):
     """
-    Sales Invoice FULL flow:
+    Queue the Sales Invoice flow on the long queue.
+    Non-blocking: the request returns as soon as the job is enqueued;
+    the result lands in the Tally Sync Log.
+    """
+    return _enqueue_validate_and_sync("Sales Invoice", invoice_name)
+
+
+@frappe.whitelist()
+def validate_and_sync_credit_note(credit_note_name):
+    """
+    Queue the Credit Note flow on the long queue.
+    Non-blocking: the request returns as soon as the job is enqueued;
+    the result lands in the Tally Sync Log.
+    """
+    return _enqueue_validate_and_sync("Credit Note", credit_note_name)
+
+
+def _validate_and_sync(flow, name):
+    """
+    Sales Invoice / Credit Note FULL flow:
     - Validate masters (customer, stock groups, items)
     - Auto-create missing masters using creators.py
     - Build XML
     - Push to Tally
+
+    Args:
+        flow: key of _VOUCHER_FLOWS
+        name: document name
     """
+    cfg = _VOUCHER_FLOWS[flow]
     settings = get_settings()
     if not settings.enabled:
         return {"success": False, "error": "Tally integration is disabled in settings"}
 
-    doc = frappe.get_doc("Sales Invoice", invoice_name)
+    doc = frappe.get_doc(cfg["doctype"], name)
+    missing = _missing_erpnext_records(doc)
+    if missing:
+        return {"success": False, "error": missing}
+
     created = []
     errors = []
+    checked = _prefetch_checked(doc, settings)
 
     # CUSTOMER LEDGER
-    cust_res = check_ledger_exists(doc.customer)
-    if not cust_res.get("exists"):
-        res = createcustomerledgerintally(doc.customer, doc.company)
+    if not _check_once(checked, check_ledger_exists, "ledger", doc.customer):
+        res = create_customer_ledger_in_tally(doc.customer, doc.company)
         if res.get("success"):
+            checked[("ledger", doc.customer)] = True
             created.append(f"Customer: {doc.customer}")
         else:
             errors.append(f"Customer '{doc.customer}': {res.get('error')}")
 
     # ITEMS & STOCK GROUPS
+    default_group = settings.default_inventory_stock_group or "Primary"
     for row in doc.items:
-        stock_group = row.item_group or settings.default_inventory_stock_group or "Primary"
+        stock_group = row.item_group or default_group
 
         # Stock group
-        group_res = check_stock_group_exists(stock_group)
-        if not group_res.get("exists"):
-            gres = createstockgroupintally(stock_group, "Primary", doc.company)
+        if not _check_once(checked, check_stock_group_exists, "stock_group", stock_group):
+            gres = create_stock_group_in_tally(stock_group, "Primary", doc.company)
             if gres.get("success"):
+                checked[("stock_group", stock_group)] = True
                 created.append(f"Stock Group: {stock_group}")
             else:
                 errors.append(f"Stock Group '{stock_group}': {gres.get('error')}")
 
         # Stock item (using item_name as master)
-        item_res = check_stock_item_exists(row.item_name)
-        if not item_res.get("exists"):
-            ires = createstockitemintally(row.item_code, doc.company)
+        if not _check_once(checked, check_stock_item_exists, "stock_item", row.item_name):
+            ires = create_stock_item_in_tally(row.item_code, doc.company)
             if ires.get("success"):
+                checked[("stock_item", row.item_name)] = True
                 created.append(f"Item: {row.item_code}")
             else:
                 errors.append(f"Item '{row.item_code}': {ires.get('error')}")
 
-    if errors:
-        # Still continue to try push, but report errors
-        frappe.msgprint(
-            "Some masters could not be created:\n" + "\n".join(errors),
-            title="Tally Master Creation Issues",
-            indicator="red",
-        )
+    # Still continue to try push; master errors are reported with the result
 
     # BUILD XML
-    xml_payload = _build_sales_invoice_xml(doc)
+    xml_payload = _build_voucher_xml(doc, cfg["voucher_type"], cfg["deemed_positive"], doc.items)
 
     # LOG + SEND
     log = create_sync_log(
-        operationtype="Create Sales Invoice",
-        doctypename="Sales Invoice",
-        docname=doc.name,
+        operation_type=cfg["operation"],
+        doctype_name=flow,
+        doc_name=doc.name,
         company=doc.company,
         xml=xml_payload,
     )
-    result = sendxmltotally(log, xml_payload)
+    result = send_xml_to_tally(log, xml_payload)
 
     if result.get("success"):
-        doc.db_set("custom_tally_synced", 1, update_modified=False)
-        frappe.db.commit()
-        frappe.msgprint(
-            f"Sales Invoice {doc.name} synced to Tally.\nCreated masters: " +
-            (", ".join(created) if created else "None"),
-            title="Tally Sync Success",
-            indicator="green",
-        )
-        return {
+        if doc.meta.has_field("custom_tally_synced"):
+            doc.db_set("custom_tally_synced", 1, update_modified=False)
+        outcome = {
             "success": True,
             "sync_log": log.name,
             "created_masters": created,
         }
+    else:
+        outcome = {
+            "success": False,
+            "sync_log": log.name,
+            "error": result.get("error"),
+            "created_masters": created,
+        }
+    if errors:
+        outcome["master_errors"] = errors
 
-    frappe.msgprint(
-        f"Failed to sync Sales Invoice {doc.name} to Tally: {result.get('error')}",
-        title="Tally Sync Failed",
-        indicator="red",
+    # One realtime event per voucher - this runs as a background job
+    frappe.publish_realtime(
+        event="tally_sync_result",
+        message={"doctype": flow, "name": doc.name, **outcome},
+        user=frappe.session.user,
     )
-    return {
-        "success": False,
-        "sync_log": log.name,
-        "error": result.get("error"),
-        "created_masters": created,
-    }
+    return outcome
 
 
-# ==================== CREDIT NOTE FLOW ====================
+# Ledger-name patterns for guess_parent_group_for_ledger ("gst" covers c/s/igst)
+_SALES_LEDGER_RE = re.compile(r"sales|revenue")
+_TAX_LEDGER_RE = re.compile(r"gst|tax|cess")
+_ROUND_LEDGER_RE = re.compile(r"round")
 
-@frappe.whitelist()
-def validate_and_sync_credit_note(credit_note_name):
-    """
-    Credit Note FULL flow:
-    - Validate masters (customer, stock groups, items)
-    - Auto-create missing masters
-    - Build XML
-    - Push to Tally
-    """
-    settings = get_settings()
-    if not settings.enabled:
-        return {"success": False, "error": "Tally integration is disabled in settings"}
+# (site, lowercased ledger name, settings.modified) -> parent group. Workers
+# serve several sites, so the site is part of the key; saving the settings
+# changes modified, so stale entries are simply never hit again
+_PARENT_GROUP_CACHE = {}
+_PARENT_GROUP_CACHE_MAX = 1024
 
-    doc = frappe.get_doc("Credit Note", credit_note_name)
-    created = []
-    errors = []
 
-    # CUSTOMER
-    cust_res = check_ledger_exists(doc.customer)
-    if not cust_res.get("exists"):
-        res = createcustomerledgerintally(doc.customer, doc.company)
-        if res.get("success"):
-            created.append(f"Customer: {doc.customer}")
-        else:
-            errors.append(f"Customer '{doc.customer}': {res.get('error')}")
-
-    # ITEMS & STOCK GROUPS
-    if hasattr(doc, "items"):
-        for row in doc.items:
-            stock_group = row.item_group or settings.default_inventory_stock_group or "Primary"
-
-            group_res = check_stock_group_exists(stock_group)
-            if not group_res.get("exists"):
-                gres = createstockgroupintally(stock_group, "Primary", doc.company)
-                if gres.get("success"):
-                    created.append(f"Stock Group: {stock_group}")
-                else:
-                    errors.append(f"Stock Group '{stock_group}': {gres.get('error')}")
-
-            item_res = check_stock_item_exists(row.item_name)
-            if not item_res.get("exists"):
-                ires = createstockitemintally(row.item_code, doc.company)
-                if ires.get("success"):
-                    created.append(f"Item: {row.item_code}")
-                else:
-                    errors.append(f"Item '{row.item_code}': {ires.get('error')}")
-
-    if errors:
-        frappe.msgprint(
-            "Some masters could not be created:\n" + "\n".join(errors),
-            title="Tally Master Creation Issues",
-            indicator="red",
-        )
-
-    # BUILD XML
-    xml_payload = _build_credit_note_xml(doc)
-
-    # LOG + SEND
-    log = create_sync_log(
-        operationtype="Create Credit Note",
-        doctypename="Credit Note",
-        docname=doc.name,
-        company=doc.company,
-        xml=xml_payload,
+def _ledger_parent_groups(settings):
+    """(sales, tax, round-off) parent groups, config-driven if present on settings DocType"""
+    return (
+        getattr(settings, "sales_ledger_parent_group", None) or "Retail Sales",
+        getattr(settings, "tax_ledger_parent_group", None) or "Duties & Taxes",
+        getattr(settings, "round_off_parent_group", None) or "Indirect Expenses",
     )
-    result = sendxmltotally(log, xml_payload)
 
-    if result.get("success"):
-        if hasattr(doc, "custom_tally_synced"):
-            doc.db_set("custom_tally_synced", 1, update_modified=False)
-        frappe.db.commit()
-        frappe.msgprint(
-            f"Credit Note {doc.name} synced to Tally.\nCreated masters: " +
-            (", ".join(created) if created else "None"),
-            title="Tally Sync Success",
-            indicator="green",
-        )
-        return {
-            "success": True,
-            "sync_log": log.name,
-            "created_masters": created,
-        }
-
-    frappe.msgprint(
-        f"Failed to sync Credit Note {doc.name} to Tally: {result.get('error')}",
-        title="Tally Sync Failed",
-        indicator="red",
-    )
-    return {
-        "success": False,
-        "sync_log": log.name,
-        "error": result.get("error"),
-        "created_masters": created,
-    }
 
-# @frappe.whitelist()
-# def create_missing_masters_for_document(doctype, docname):
-#     """
-#     Generic API: check a document (SO, SI, CN) and auto-create missing masters in Tally.
-
-#     - Customer ledger
-#     - Stock group (based on item_group or default)
-#     - Stock item (based on item_code)
-
-#     Returns:
-#         {
-#             "success": bool,
-#             "created": [...],
-#             "errors": [...],
-#         }
-#     """
-
-#     settings = get_settings()
-#     if not settings.enabled:
-#         return {
-#             "success": False,
-#             "created": [],
-#             "errors": ["Tally integration is disabled in settings"],
-#         }
-
-#     doc = frappe.get_doc(doctype, docname)
-#     created = []
-#     errors = []
-
-#     # 1. CUSTOMER LEDGER
-#     if getattr(doc, "customer", None):
-#         cust_res = check_ledger_exists(doc.customer)
-#         if not cust_res.get("exists"):
-#             res = create_customer_ledger_in_tally(doc.customer, doc.company)
-#             if res.get("success"):
-#                 created.append(f"Customer: {doc.customer}")
-#             else:
-#                 errors.append(f"Customer '{doc.customer}': {res.get('error')}")
-
-#     # 2. ITEMS (STOCK GROUP + STOCK ITEM)
-#     if hasattr(doc, "items"):
-#         for row in doc.items:
-#             # Determine stock group
-#             stock_group = (
-#                 getattr(row, "item_group", None)
-#                 or getattr(settings, "default_inventory_stock_group", None)
-#                 or "Primary"
-#             )
-
-#             # 2.a Stock Group
-#             group_res = check_stock_group_exists(stock_group)
-#             if not group_res.get("exists"):
-#                 gres = create_stock_group_in_tally(stock_group, "Primary", doc.company)
-#                 if gres.get("success"):
-#                     created.append(f"Stock Group: {stock_group}")
-#                 else:
-#                     errors.append(f"Stock Group '{stock_group}': {gres.get('error')}")
-
-#             # 2.b Stock Item
-#             item_code = row.item_code
-#             item_name_for_check = row.item_name or item_code
-
-#             item_res = check_stock_item_exists(item_name_for_check)
-#             if not item_res.get("exists"):
-#                 ires = create_stock_item_in_tally(item_code, doc.company)
-#                 if ires.get("success"):
-#                     created.append(f"Item: {item_code}")
-#                 else:
-#                     errors.append(f"Item '{item_code}': {ires.get('error')}")
-
-#     return {
-#         "success": len(errors) == 0,
-#         "created": created,
-#         "errors": errors,
-#     }
-
-# def guess_parent_group_for_ledger(ledger_name, settings):
-#     """
-#     Decide parent group for a ledger.
-
-#     Uses config when available; only guesses for common patterns.
-#     Returns None if no safe mapping is found so caller can raise
-#     a clear error instead of putting ledger under a wrong group.
-#     """
-#     name = (ledger_name or "").lower()
-
-#     # Config-driven parents if present on settings DocType
-#     sales_parent = getattr(settings, "sales_ledger_parent_group", None) or "Sales Accounts"
-#     tax_parent = getattr(settings, "tax_ledger_parent_group", None) or "Duties & Taxes"
-#     round_parent = getattr(settings, "round_off_parent_group", None) or "Indirect Expenses"
-
-#     # Sales / revenue ledgers
-#     if "sales" in name or "revenue" in name:
-#         return sales_parent
-
-#     # GST / tax / cess ledgers
-#     if any(key in name for key in ["cgst", "sgst", "igst", "gst", "tax", "cess"]):
-#         return tax_parent
-
-#     # Round-off ledgers
-#     if "round" in name:
-#         return round_parent
-
-#     # No safe guess
-#     return None
-def guess_parent_group_for_ledger(ledger_name, settings):
+def guess_parent_group_for_ledger(ledger_name, settings, parents=None):
     """
     Decide parent group for a ledger.
 
     Uses config when available; only guesses for common patterns.
     Returns None if no safe mapping is found so caller can raise
     a clear error instead of putting ledger under a wrong group.
+    Callers guessing for several ledgers can pass parents from
+    _ledger_parent_groups(settings) to read the settings once.
     """
     name = (ledger_name or "").lower()
+    key = (getattr(frappe.local, "site", None), name, getattr(settings, "modified", None))
+    if key in _PARENT_GROUP_CACHE:
+        return _PARENT_GROUP_CACHE[key]
+
+    if len(_PARENT_GROUP_CACHE) >= _PARENT_GROUP_CACHE_MAX:
+        _PARENT_GROUP_CACHE.clear()
+    parent = _PARENT_GROUP_CACHE[key] = _match_parent_group(
+        name, parents or _ledger_parent_groups(settings)
+    )
+    return parent
 
-    # Config-driven parents if present on settings DocType
-    sales_parent = getattr(settings, "sales_ledger_parent_group", None) or "Retail Sales"
-    tax_parent = getattr(settings, "tax_ledger_parent_group", None) or "Duties & Taxes"
-    round_parent = getattr(settings, "round_off_parent_group", None) or "Indirect Expenses"
+
+def _match_parent_group(name, parents):
+    """Parent group for a lowercased ledger name, or None"""
+    sales_parent, tax_parent, round_parent = parents
 
     # Sales / revenue ledgers
-    if "sales" in name or "revenue" in name:
+    if _SALES_LEDGER_RE.search(name):
         return sales_parent
 
     # GST / tax / cess ledgers
-    if any(key in name for key in ["cgst", "sgst", "igst", "gst", "tax", "cess"]):
+    if _TAX_LEDGER_RE.search(name):
         return tax_parent
 
     # Round-off ledgers
-    if "round" in name:
+    if _ROUND_LEDGER_RE.search(name):
         return round_parent
 
     # No safe guess
     return None
 
 @frappe.whitelist()
-def create_missing_masters_for_document(doctype, docname):
+def create_missing_masters_for_document(doctype, docname, doc=None):
     """
     Generic API: check a document (SO, SI, CN) and auto-create missing masters in Tally.
+    Callers that already hold the document can pass doc to skip reloading it.
 
     Handles:
       - Customer ledger
@@ -736,69 +697,78 @@ def create_missing_masters_for_document(doctype, docname):
             "errors": ["Tally integration is disabled in settings"],
         }
 
-    doc = frappe.get_doc(doctype, docname)
+    # Whitelisted calls get doc as a JSON string - ignore it and load ourselves
+    if not hasattr(doc, "doctype"):
+        doc = frappe.get_doc(doctype, docname)
+
+    # Masters already verified for this document - nothing to ask Tally
+    has_verified_flag = doc.meta.has_field(_MASTERS_VERIFIED_FIELD)
+    if has_verified_flag and doc.get(_MASTERS_VERIFIED_FIELD):
+        return {"success": True, "created": [], "errors": [], "cached": True}
+
+    required_ledgers = {}
+    if doctype == "Sales Invoice":
+        required_ledgers = {
+            "Sales": settings.sales_ledger_name or "SALES A/C",
+            "CGST": settings.cgst_ledger_name or "CGST",
+            "SGST": settings.sgst_ledger_name or "SGST",
+            "IGST": settings.igst_ledger_name or "IGST",
+            "Round Off": settings.round_off_ledger_name or "Round Off",
+        }
+
+    # One bulk lookup (collections fetched concurrently) instead of a
+    # Tally round-trip per row
+    checked = _prefetch_checked(doc, settings, required_ledgers.values())
     created = []
     errors = []
 
     # ---------- 1. CUSTOMER LEDGER ----------
     if getattr(doc, "customer", None):
-        cust_res = check_ledger_exists(doc.customer)
-        if not cust_res.get("exists"):
+        if not _check_once(checked, check_ledger_exists, "ledger", doc.customer):
             res = create_customer_ledger_in_tally(doc.customer, doc.company)
             if res.get("success"):
                 created.append(f"Customer: {doc.customer}")
+                checked[("ledger", doc.customer)] = True
             else:
                 errors.append(f"Customer '{doc.customer}': {res.get('error')}")
 
     # ---------- 2. ITEMS (STOCK GROUP + STOCK ITEM) ----------
-    if hasattr(doc, "items"):
-        for row in doc.items:
-            # 2.a Stock Group
-            stock_group = (
-                getattr(row, "item_group", None)
-                or getattr(settings, "default_inventory_stock_group", None)
-                or "Primary"
-            )
-
-            group_res = check_stock_group_exists(stock_group)
-            if not group_res.get("exists"):
-                gres = create_stock_group_in_tally(stock_group, "Primary", doc.company)
-                if gres.get("success"):
-                    created.append(f"Stock Group: {stock_group}")
-                else:
-                    errors.append(f"Stock Group '{stock_group}': {gres.get('error')}")
-
-            # 2.b Stock Item
-            item_code = row.item_code
-            item_name_for_check = row.item_name or item_code
-
-            item_res = check_stock_item_exists(item_name_for_check)
-            if not item_res.get("exists"):
-                ires = create_stock_item_in_tally(item_code, doc.company)
-                if ires.get("success"):
-                    created.append(f"Item: {item_code}")
-                else:
-                    errors.append(f"Item '{item_code}': {ires.get('error')}")
+    default_group = getattr(settings, "default_inventory_stock_group", None) or "Primary"
+    for row in doc.get("items") or []:
+        # 2.a Stock Group
+        stock_group = getattr(row, "item_group", None) or default_group
 
-    # ---------- 3. LEDGERS FOR SALES INVOICE ----------
-    if doctype == "Sales Invoice":
-        required_ledgers = {
-            "Sales": settings.sales_ledger_name or "SALES A/C",
-            "CGST": settings.cgst_ledger_name or "CGST",
-            "SGST": settings.sgst_ledger_name or "SGST",
-            "IGST": settings.igst_ledger_name or "IGST",
-            "Round Off": settings.round_off_ledger_name or "Round Off",
-        }
+        if not _check_once(checked, check_stock_group_exists, "stock_group", stock_group):
+            gres = create_stock_group_in_tally(stock_group, "Primary", doc.company)
+            if gres.get("success"):
+                created.append(f"Stock Group: {stock_group}")
+                checked[("stock_group", stock_group)] = True
+            else:
+                errors.append(f"Stock Group '{stock_group}': {gres.get('error')}")
+
+        # 2.b Stock Item
+        item_code = row.item_code
+        item_name_for_check = row.item_name or item_code
+
+        if not _check_once(checked, check_stock_item_exists, "stock_item", item_name_for_check):
+            ires = create_stock_item_in_tally(item_code, doc.company)
+            if ires.get("success"):
+                created.append(f"Item: {item_code}")
+                checked[("stock_item", item_name_for_check)] = True
+            else:
+                errors.append(f"Item '{item_code}': {ires.get('error')}")
 
+    # ---------- 3. LEDGERS FOR SALES INVOICE ----------
+    if required_ledgers:
+        parents = _ledger_parent_groups(settings)
         for kind, ledger in required_ledgers.items():
             if not ledger:
                 continue
 
-            res = check_ledger_exists(ledger)
-            if res.get("exists"):
+            if _check_once(checked, check_ledger_exists, "ledger", ledger):
                 continue
 
-            parent = guess_parent_group_for_ledger(ledger, settings)
+            parent = guess_parent_group_for_ledger(ledger, settings, parents)
             if not parent:
                 errors.append(
                     f"Cannot auto-create {kind} ledger '{ledger}' – no parent group mapping found"
@@ -808,11 +778,38 @@ def create_missing_masters_for_document(doctype, docname):
             cres = create_generic_ledger_in_tally(ledger, parent, doc.company)
             if cres.get("success"):
                 created.append(f"Ledger: {ledger} (parent {parent})")
+                checked[("ledger", ledger)] = True
             else:
                 errors.append(f"{kind} ledger '{ledger}': {cres.get('error')}")
 
+    if has_verified_flag and not errors:
+        doc.db_set(_MASTERS_VERIFIED_FIELD, 1, update_modified=False)
+
     return {
         "success": len(errors) == 0,
         "created": created,
         "errors": errors,
     }
+
+
+def _master_signature(doc):
+    """The party and item fields create_missing_masters_for_document looks at"""
+    return (
+        doc.get("customer"),
+        tuple(
+            (row.get("item_code"), row.get("item_name"), row.get("item_group"))
+            for row in doc.get("items") or ()
+        ),
+    )
+
+
+def reset_masters_verified(doc, method=None):
+    """
+    before_save: clear the masters-verified flag when the customer or
+    the item rows change, so the next sync checks Tally again.
+    """
+    if not doc.get(_MASTERS_VERIFIED_FIELD):
+        return
+    before = doc.get_doc_before_save()
+    if before is None or _master_signature(before) != _master_signature(doc):
+        doc.set(_MASTERS_VERIFIED_FIELD, 0)
@@ -1,4 +1,27 @@
 frappe.ui.form.on('Sales Invoice', {
+    onload: function(frm) {
+        // Result of the queued validate-and-sync job (sales invoice or credit note)
+        if (frm._tally_sync_listener) return;
+        frm._tally_sync_listener = true;
+        frappe.realtime.on('tally_sync_result', function(data) {
+            if (!data || data.name !== frm.doc.name) return;
+            let message = data.success
+                ? 'Synced to Tally.'
+                : 'Tally sync failed: ' + (data.error || 'Unknown error');
+            if (data.created_masters && data.created_masters.length) {
+                message += '<br>Created masters: ' + data.created_masters.join(', ');
+            }
+            if (data.master_errors && data.master_errors.length) {
+                message += '<br>Master issues:<br>' + data.master_errors.join('<br>');
+            }
+            frappe.msgprint({
+                title: data.success ? 'Tally Sync Success' : 'Tally Sync Failed',
+                indicator: data.success ? 'green' : 'red',
+                message: message
+            });
+            if (data.success) frm.reload_doc();
+        });
+    },
     refresh: function(frm) {
         if (frm.doc.docstatus === 1) {  // Only for submitted invoices
             frm.add_custom_button(__('Push to Tally'), function() {
@@ -284,8 +284,8 @@ function check_tally_dependencies(frm) {
                 return;
             }
             
-            if (r.message.has_missing) {
-                show_missing_masters_dialog(frm, r.message.missing_masters);
+            if (r.message.count) {
+                show_missing_masters_dialog(frm, r.message.missing.map(expand_missing_master));
             } else {
                 frappe.show_alert({
                     message: __('✅ All dependencies exist in Tally'),
@@ -304,6 +304,15 @@ function check_tally_dependencies(frm) {
     });
 }
 
+// Server omits keys equal to their defaults - restore them
+function expand_missing_master(master) {
+    return Object.assign({
+        display_name: master.name,
+        erpnext_doctype: master.type,
+        priority: 'Normal'
+    }, master);
+}
+
 function show_missing_masters_dialog(frm, missing_masters) {
     console.log("📋 Missing masters:", missing_masters);
     
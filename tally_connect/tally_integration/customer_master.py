@@ -21,8 +21,10 @@ def get_customer_parent_group(customer_doc, company):
         if row.company == company:
             if row.account:
                 # Return the account name
-                account_doc = frappe.get_doc("Account", row.account)
-                return account_doc.account_name or row.account
+                account_name = frappe.db.get_value(
+                    "Account", row.account, "account_name", cache=True
+                )
+                return account_name or row.account
     
     # Fallback to global setting
     settings = get_settings()
@@ -36,30 +38,126 @@ def customer_ledger_exists_in_tally(customer_name):
     # TODO: implement actual Tally query
     return False
 
+def get_customer_address(customer_name):
+    """
+    Latest Address linked to the customer - only the columns the ledger
+    XML needs, one JOIN instead of a Dynamic Link lookup plus get_doc
+    """
+    rows = frappe.db.sql("""
+        SELECT a.address_line1, a.address_line2, a.city, a.state
+        FROM `tabAddress` a
+        JOIN `tabDynamic Link` dl ON dl.parent = a.name
+        WHERE dl.parenttype = 'Address'
+            AND dl.link_doctype = 'Customer'
+            AND dl.link_name = %s
+        ORDER BY dl.creation DESC
+        LIMIT 1
+    """, (customer_name,), as_dict=True)
+    return rows[0] if rows else None
+
+def get_customer_contact(customer_name):
+    """
+    Latest Contact linked to the customer - phone and email only
+    """
+    rows = frappe.db.sql("""
+        SELECT c.mobile_no, c.phone, c.email_id
+        FROM `tabContact` c
+        JOIN `tabDynamic Link` dl ON dl.parent = c.name
+        WHERE dl.parenttype = 'Contact'
+            AND dl.link_doctype = 'Customer'
+            AND dl.link_name = %s
+        ORDER BY dl.creation DESC
+        LIMIT 1
+    """, (customer_name,), as_dict=True)
+    return rows[0] if rows else None
+
+def get_customer_addresses(customer_names):
+    """
+    get_customer_address for many customers in one query
+    Returns {customer_name: row} for customers that have an address
+    """
+    if not customer_names:
+        return {}
+    rows = frappe.db.sql("""
+        SELECT dl.link_name, a.address_line1, a.address_line2, a.city, a.state
+        FROM `tabAddress` a
+        JOIN `tabDynamic Link` dl ON dl.parent = a.name
+        WHERE dl.parenttype = 'Address'
+            AND dl.link_doctype = 'Customer'
+            AND dl.link_name IN %(names)s
+        ORDER BY dl.creation DESC
+    """, {"names": tuple(customer_names)}, as_dict=True)
+    by_customer = {}
+    for row in rows:
+        by_customer.setdefault(row.link_name, row)
+    return by_customer
+
+def get_customer_contacts(customer_names):
+    """
+    get_customer_contact for many customers in one query
+    Returns {customer_name: row} for customers that have a contact
+    """
+    if not customer_names:
+        return {}
+    rows = frappe.db.sql("""
+        SELECT dl.link_name, c.mobile_no, c.phone, c.email_id
+        FROM `tabContact` c
+        JOIN `tabDynamic Link` dl ON dl.parent = c.name
+        WHERE dl.parenttype = 'Contact'
+            AND dl.link_doctype = 'Customer'
+            AND dl.link_name IN %(names)s
+        ORDER BY dl.creation DESC
+    """, {"names": tuple(customer_names)}, as_dict=True)
+    by_customer = {}
+    for row in rows:
+        by_customer.setdefault(row.link_name, row)
+    return by_customer
+
 def build_customer_ledger_xml(customer_doc, parent_group, company):
     """
     Build Tally XML for customer ledger creation
     """
+    return _customer_ledger_xml(
+        customer_doc,
+        parent_group,
+        get_customer_address(customer_doc.name),
+        get_customer_contact(customer_doc.name)
+    )
+
+def build_customer_ledger_xml_bulk(customer_names):
+    """
+    Build ledger XML for many customers with two address/contact queries
+    in total instead of two per customer
+    
+    Returns:
+        dict: {customer_name: xml}
+    """
+    settings = get_settings()
+    addresses = get_customer_addresses(customer_names)
+    contacts = get_customer_contacts(customer_names)
+    
+    xml_by_customer = {}
+    for customer_name in customer_names:
+        customer = frappe.get_doc("Customer", customer_name)
+        company = settings.erpnext_company or customer.get("default_company")
+        xml_by_customer[customer_name] = _customer_ledger_xml(
+            customer,
+            get_customer_parent_group(customer, company),
+            addresses.get(customer_name),
+            contacts.get(customer_name)
+        )
+    return xml_by_customer
+
+def _customer_ledger_xml(customer_doc, parent_group, addr, contact):
+    """Ledger XML from an already-fetched address/contact row (or None)"""
     name = escape(customer_doc.customer_name or customer_doc.name)
     parent = escape(parent_group)
     gstin = escape(customer_doc.gstin or "") if hasattr(customer_doc, 'gstin') else ""
     
-    # Get primary address
-    address_list = frappe.get_all(
-        "Dynamic Link",
-        filters={
-            "link_doctype": "Customer",
-            "link_name": customer_doc.name,
-            "parenttype": "Address"
-        },
-        fields=["parent"],
-        limit=1
-    )
-    
+    # Primary address
     address_line = ""
     state = ""
-    if address_list:
-        addr = frappe.get_doc("Address", address_list[0].parent)
+    if addr:
         address_line = ", ".join(filter(None, [
             addr.address_line1,
             addr.address_line2,
@@ -67,22 +165,10 @@ def build_customer_ledger_xml(customer_doc, parent_group, company):
         ]))
         state = addr.state or ""
     
-    # Get primary contact
-    contact_list = frappe.get_all(
-        "Dynamic Link",
-        filters={
-            "link_doctype": "Customer",
-            "link_name": customer_doc.name,
-            "parenttype": "Contact"
-        },
-        fields=["parent"],
-        limit=1
-    )
-    
+    # Primary contact
     mobile = ""
     email = ""
-    if contact_list:
-        contact = frappe.get_doc("Contact", contact_list[0].parent)
+    if contact:
         mobile = contact.mobile_no or contact.phone or ""
         email = contact.email_id or ""
     
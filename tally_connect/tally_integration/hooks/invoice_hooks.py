@@ -102,7 +102,8 @@ def check_dependencies_before_submit(doc, method):
     try:
         result = create_missing_masters_for_document(
             doctype=doc.doctype, 
-            docname=doc.name
+            docname=doc.name,
+            doc=doc
         )
         
         # ⭐ SHOW RESULTS
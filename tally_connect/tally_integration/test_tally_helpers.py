@@ -0,0 +1,144 @@
+# Copyright (c) 2025, Kunal Verma and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from tally_connect.tally_integration import utils
+from tally_connect.tally_integration.api.dependency_checker import (
+    MissingMaster,
+    _compact_missing_master,
+)
+from tally_connect.tally_integration.api.sync_engine import _read_import_result
+from tally_connect.tally_integration.api.validators import _match_parent_group
+
+
+class FakeCache:
+    """Stand-in for frappe.cache() that records TTLs"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def get_value(self, key):
+        return self.values.get(key)
+
+    def set_value(self, key, value, expires_in_sec=None):
+        self.values[key] = value
+        self.ttls[key] = expires_in_sec
+
+    def delete_value(self, key):
+        self.values.pop(key, None)
+        self.ttls.pop(key, None)
+
+
+class TestReadImportResult(FrappeTestCase):
+    def test_created(self):
+        content = b"<RESPONSE><CREATED>1</CREATED><ERRORS>0</ERRORS></RESPONSE>"
+        self.assertEqual(_read_import_result(content), (1, None))
+
+    def test_line_error(self):
+        content = (
+            b"<RESPONSE><LINEERROR> Ledger 'X' does not exist </LINEERROR>"
+            b"<LINEERROR>second</LINEERROR><CREATED>0</CREATED></RESPONSE>"
+        )
+        self.assertEqual(_read_import_result(content), (0, "Ledger 'X' does not exist"))
+
+    def test_invalid_xml_falls_back_to_text_search(self):
+        self.assertEqual(_read_import_result(b"<RESPONSE>\x04<CREATED>1</CREATED>"), (1, None))
+        self.assertEqual(_read_import_result(b"<RESPONSE>\x04<CREATED>0</CREATED>"), (0, None))
+
+
+class TestMatchParentGroup(FrappeTestCase):
+    parents = ("Retail Sales", "Duties & Taxes", "Indirect Expenses")
+
+    def test_known_patterns(self):
+        self.assertEqual(_match_parent_group("sales gst 18%", self.parents), "Retail Sales")
+        self.assertEqual(_match_parent_group("output cgst", self.parents), "Duties & Taxes")
+        self.assertEqual(_match_parent_group("round off", self.parents), "Indirect Expenses")
+
+    def test_no_safe_guess(self):
+        self.assertIsNone(_match_parent_group("acme corp", self.parents))
+
+
+class TestCompactMissingMaster(FrappeTestCase):
+    def test_defaults_dropped(self):
+        master = MissingMaster(
+            type="Customer", erpnext_doctype="Customer", name="ACME", display_name="ACME",
+            parent="Sundry Debtors",
+        )
+        self.assertEqual(
+            _compact_missing_master(master),
+            {"type": "Customer", "name": "ACME", "parent": "Sundry Debtors"},
+        )
+
+    def test_non_defaults_kept(self):
+        master = MissingMaster(
+            type="Ledger", erpnext_doctype="Account", name="Sales - A", display_name="Sales",
+            parent="Sales Accounts", priority="High",
+        )
+        self.assertEqual(
+            _compact_missing_master(master),
+            {
+                "type": "Ledger", "name": "Sales - A", "parent": "Sales Accounts",
+                "display_name": "Sales", "erpnext_doctype": "Account", "priority": "High",
+            },
+        )
+
+
+class TestCheckMastersExistBulk(FrappeTestCase):
+    def setUp(self):
+        self.cache = FakeCache()
+        self.memo = {}
+        patches = [
+            patch.object(utils.frappe, "cache", return_value=self.cache),
+            patch.object(utils, "get_request_cache", return_value=self.memo),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def check(self, type_to_names, fetched, errors=None):
+        with patch.object(utils, "_fetch_master_names", return_value=fetched) as fetch:
+            result = utils.check_masters_exist_bulk(type_to_names, url="http://tally", errors=errors)
+        return result, fetch
+
+    def test_hit_and_miss_ttls(self):
+        result, fetch = self.check({"Ledger": ["ACME", "Ghost"]}, ({"acme"}, None))
+
+        self.assertEqual(result, {("Ledger", "ACME"): True, ("Ledger", "Ghost"): False})
+        fetch.assert_called_once()
+        hit_key = utils._master_exists_cache_key("Ledger", "ACME")
+        miss_key = utils._missing_cache_key(utils._master_exists_cache_key("Ledger", "Ghost"))
+        self.assertEqual(self.cache.ttls[hit_key], utils.MASTER_EXISTS_CACHE_TTL)
+        self.assertEqual(self.cache.ttls[miss_key], utils.MASTER_MISSING_CACHE_TTL)
+        self.assertEqual(
+            self.cache.ttls[utils._master_names_cache_key("Ledger")], utils.MASTER_MISSING_CACHE_TTL
+        )
+
+    def test_cached_answers_skip_export(self):
+        self.check({"Ledger": ["ACME", "Ghost"]}, ({"acme"}, None))
+        self.memo.clear()
+
+        result, fetch = self.check({"Ledger": ["ACME", "Ghost"]}, ({"acme", "ghost"}, None))
+
+        self.assertEqual(result, {("Ledger", "ACME"): True, ("Ledger", "Ghost"): False})
+        fetch.assert_not_called()
+
+    def test_new_name_answered_from_name_set(self):
+        self.check({"Ledger": ["ACME"]}, ({"acme", "beta"}, None))
+
+        result, fetch = self.check({"Ledger": ["Beta"]}, (None, "unreachable"))
+
+        self.assertEqual(result, {("Ledger", "Beta"): True})
+        fetch.assert_not_called()
+
+    def test_failed_export_not_cached(self):
+        errors = {}
+        with patch.object(utils.frappe, "log_error"):
+            result, _fetch = self.check({"Group": ["Sundry Debtors"]}, (None, "Connection refused"), errors)
+
+        self.assertEqual(result, {("Group", "Sundry Debtors"): False})
+        self.assertEqual(errors, {"Group": "Connection refused"})
+        self.assertEqual(self.cache.values, {})
@@ -19,16 +19,98 @@ import requests
 import re
 import html  # ← ADD THIS: For proper XML entity handling (&amp; → &)
 from frappe.utils import now
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from xml.etree import ElementTree as ET
 
+# One pooled keep-alive connection to Tally per worker instead of a fresh
+# TCP handshake on every request
+_SESSION = requests.Session()
+# Retry only failed connects - a retried POST that reached Tally could
+# import the same voucher twice
+_ADAPTER = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.3),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
+def get_tally_session():
+    """Shared requests.Session for talking to the Tally server"""
+    return _SESSION
+
 
 # ============================================================================
 # SETTINGS HELPERS
 # ============================================================================
 
 def get_settings():
-    """Get Tally Integration Settings singleton"""
-    return frappe.get_single("Tally Integration Settings")
+    """
+    Get Tally Integration Settings singleton
+    Loaded once per request - the parent-group, stock-group and builder
+    helpers all call this, often several times per document. Across
+    requests it comes from Frappe's document cache, which is cleared when
+    the settings are saved. Treat it as read-only.
+    """
+    cache = get_request_cache("tally_settings")
+    if "settings" not in cache:
+        cache["settings"] = frappe.get_cached_doc("Tally Integration Settings")
+    return cache["settings"]
+
+
+def get_request_cache(bucket):
+    """
+    Request-scoped dict for memoizing lookups
+    Lives on frappe.local.cache, which Frappe resets at the end of every
+    request/job, so values never leak across requests.
+    """
+    return frappe.local.cache.setdefault(bucket, {})
+
+
+def get_party_account(party_type, party, company):
+    """Receivable/payable account set on a Customer/Supplier for one company"""
+    return frappe.db.get_value(
+        "Party Account",
+        {"parenttype": party_type, "parent": party, "company": company},
+        "account"
+    )
+
+
+def get_account_group_names(account):
+    """
+    Account's own name and its parent group's name in one query
+    
+    Returns:
+        frappe._dict: {account_name, parent_name} (parent_name None for root
+        accounts), or None if the account does not exist
+    """
+    rows = frappe.db.sql(
+        """
+        SELECT a.account_name, p.account_name AS parent_name
+        FROM `tabAccount` a
+        LEFT JOIN `tabAccount` p ON p.name = a.parent_account
+        WHERE a.name = %s
+        """,
+        account,
+        as_dict=True
+    )
+    return rows[0] if rows else None
+
+
+def log_error_once(message, title):
+    """
+    frappe.log_error, at most once per title per request
+    Error Log rows are DB writes; a misconfigured master hit from every item
+    row should not turn a read-only check into a write storm.
+    """
+    logged = get_request_cache("tally_logged_errors")
+    if title in logged:
+        return
+    logged[title] = True
+    frappe.log_error(message, title)
 
 
 def is_enabled():
@@ -192,7 +274,7 @@ def check_tally_connectivity(url=None):
         }
     
     try:
-        response = requests.get(url, timeout=10)
+        response = _SESSION.get(url, timeout=10)
         
         if response.status_code != 200:
             return {
@@ -292,7 +374,7 @@ def verify_tally_company(company_name=None, url=None):
 </ENVELOPE>"""
     
     try:
-        response = requests.post(
+        response = _SESSION.post(
             url,
             data=company_xml.encode("utf-8"),
             headers={"Content-Type": "text/xml; charset=utf-8"},
@@ -439,38 +521,34 @@ def verify_tally_company(company_name=None, url=None):
         }
 
 
-def check_master_exists(master_type, master_name, url=None):
-    """
-    Check if a master exists in Tally
-    Uses TDL format - SAME AS YOUR WORKING TEST SCRIPTS
-    
-    Args:
-        master_type: "Group", "Ledger", "StockGroup", "StockItem", "Godown"
-        master_name: Name to check
-        url: Tally URL (optional)
-    
-    Returns:
-        dict: {"success": bool, "exists": bool, "master_type": str, "master_name": str}
-    """
-    if not url:
-        settings = get_settings()
-        url = settings.tally_url
-    
-    collection_map = {
-        "Group": "Group",
-        "Ledger": "Ledger",
-        "StockGroup": "StockGroup",
-        "StockItem": "StockItem",
-        "Godown": "Godown",
-        "Unit": "Unit",
-        "GSTClassification": "GSTClassification"  # ✅ ADD THIS
-        
-    }
-    
-    collection_name = collection_map.get(master_type, "Ledger")
-    
-    # ✅ WORKING XML with TDL - Same format as your test scripts
-    check_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+# ============================================================================
+# MASTER EXISTENCE CHECKS
+# ============================================================================
+
+MASTER_COLLECTION_MAP = {
+    "Group": "Group",
+    "Ledger": "Ledger",
+    "StockGroup": "StockGroup",
+    "StockItem": "StockItem",
+    "Godown": "Godown",
+    "Unit": "Unit",
+    "GSTClassification": "GSTClassification"
+}
+
+MASTER_ELEMENT_MAP = {
+    "Group": "GROUP",
+    "Ledger": "LEDGER",
+    "StockGroup": "STOCKGROUP",
+    "StockItem": "STOCKITEM",
+    "Godown": "GODOWN",
+    "Unit": "UNIT",
+    "GSTClassification": "GSTCLASSIFICATION"
+}
+
+
+def _build_collection_export_xml(collection_name):
+    """Build the TDL collection export request used for existence checks"""
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
 <ENVELOPE>
   <HEADER>
     <VERSION>1</VERSION>
@@ -494,9 +572,181 @@ def check_master_exists(master_type, master_name, url=None):
     </DESC>
   </BODY>
 </ENVELOPE>"""
+
+
+MASTER_EXISTS_CACHE_PREFIX = "tally:exists:"
+# Misses and name sets live under their own prefix so they can be flushed
+# without touching the long-lived positive answers
+MASTER_MISSING_CACHE_PREFIX = "tally:missing:"
+# Masters are rarely deleted in Tally; anything created through this app
+# clears the cache, and clear_master_cache() forces a refresh
+MASTER_EXISTS_CACHE_TTL = 24 * 60 * 60  # seconds
+# "Not found" answers (and the name sets that produce them) expire sooner:
+# a misconfigured group stops hammering Tally, yet a master created
+# directly in Tally is picked up within seconds
+MASTER_MISSING_CACHE_TTL = 30  # seconds
+
+# Upper bound on collection exports check_masters_exist_bulk runs at once.
+# Tally answers HTTP from a single-threaded server, so more than a few
+# concurrent exports only queue up on its side.
+MASTER_FETCH_WORKERS = 3
+
+
+def _master_exists_cache_key(master_type, master_name):
+    return f"{MASTER_EXISTS_CACHE_PREFIX}{master_type}:{normalize_name_for_comparison(master_name)}"
+
+
+def _missing_cache_key(cache_key):
+    """Redis key holding the "not found" answer for an existence cache key"""
+    return MASTER_MISSING_CACHE_PREFIX + cache_key[len(MASTER_EXISTS_CACHE_PREFIX):]
+
+
+def _get_cached_exists(cache_key):
+    """
+    Cached existence answer, or None
+    Checks the request memo first so repeat lookups in one batch skip the
+    Redis round-trip; Redis answers are copied into the memo.
+    """
+    memo = get_request_cache("tally_master_exists")
+    if cache_key in memo:
+        return memo[cache_key]
+    
+    cached = frappe.cache().get_value(cache_key)
+    if cached is None and frappe.cache().get_value(_missing_cache_key(cache_key)):
+        cached = False
+    if cached is not None:
+        memo[cache_key] = cached
+    return cached
+
+
+def _set_cached_exists(cache_key, exists):
+    """Store an existence answer in the request memo and Redis"""
+    get_request_cache("tally_master_exists")[cache_key] = exists
+    if exists:
+        frappe.cache().set_value(cache_key, True, expires_in_sec=MASTER_EXISTS_CACHE_TTL)
+    else:
+        # A master gone from Tally must not keep answering from the hit key
+        frappe.cache().delete_value(cache_key)
+        frappe.cache().set_value(
+            _missing_cache_key(cache_key), True, expires_in_sec=MASTER_MISSING_CACHE_TTL
+        )
+
+
+def _master_names_cache_key(master_type):
+    return f"{MASTER_MISSING_CACHE_PREFIX}names:{master_type}"
+
+
+def _get_cached_master_names(master_type):
+    """
+    Normalized names of every master of this type from the last export,
+    or None. Lets a name the per-name cache hasn't seen yet be answered
+    without exporting the collection again.
+    """
+    cache_key = _master_names_cache_key(master_type)
+    memo = get_request_cache("tally_master_exists")
+    if cache_key in memo:
+        return memo[cache_key]
+    
+    names = frappe.cache().get_value(cache_key)
+    if names is not None:
+        memo[cache_key] = names
+    return names
+
+
+def _set_cached_master_names(master_type, names):
+    """Store a collection's normalized name set in the request memo and Redis"""
+    cache_key = _master_names_cache_key(master_type)
+    names = frozenset(names)
+    get_request_cache("tally_master_exists")[cache_key] = names
+    frappe.cache().set_value(cache_key, names, expires_in_sec=MASTER_MISSING_CACHE_TTL)
+
+
+def clear_master_exists_cache(master_type=None, master_name=None):
+    """
+    Drop cached existence results
+    Call with (type, name) after creating one master (the creators do),
+    or with no args to flush everything. Masters created outside these
+    creators are picked up once their "not found" answer expires
+    (MASTER_MISSING_CACHE_TTL).
+    """
+    memo = get_request_cache("tally_master_exists")
+    if master_type and master_name:
+        cache_key = _master_exists_cache_key(master_type, master_name)
+        memo.pop(cache_key, None)
+        frappe.cache().delete_value(cache_key)
+        frappe.cache().delete_value(_missing_cache_key(cache_key))
+        # The type's name set is stale too once one of its masters changes
+        names_key = _master_names_cache_key(master_type)
+        memo.pop(names_key, None)
+        frappe.cache().delete_value(names_key)
+    else:
+        memo.clear()
+        frappe.cache().delete_keys(MASTER_EXISTS_CACHE_PREFIX)
+        frappe.cache().delete_keys(MASTER_MISSING_CACHE_PREFIX)
+
+
+def check_master_exists(master_type, master_name, url=None):
+    """
+    Check if a master exists in Tally
+    Uses TDL format - SAME AS YOUR WORKING TEST SCRIPTS
+    
+    Successful answers are cached in Redis (MASTER_EXISTS_CACHE_TTL seconds,
+    MASTER_MISSING_CACHE_TTL for misses), so bulk submits sharing
+    customers/items don't re-query Tally,
+    and memoized for the rest of the request on top of that.
+    
+    Args:
+        master_type: "Group", "Ledger", "StockGroup", "StockItem", "Godown"
+        master_name: Name to check
+        url: Tally URL (optional)
+    
+    Returns:
+        dict: {"success": bool, "exists": bool, "master_type": str, "master_name": str}
+    """
+    cache_key = _master_exists_cache_key(master_type, master_name)
+    cached = _get_cached_exists(cache_key)
+    if cached is not None:
+        return {
+            "success": True,
+            "exists": cached,
+            "master_type": master_type,
+            "master_name": master_name,
+            "cached": True
+        }
+    
+    names = _get_cached_master_names(master_type)
+    if names is not None:
+        exists = normalize_name_for_comparison(master_name) in names
+        _set_cached_exists(cache_key, exists)
+        return {
+            "success": True,
+            "exists": exists,
+            "master_type": master_type,
+            "master_name": master_name,
+            "cached": True
+        }
+    
+    result = _query_master_exists(master_type, master_name, url)
+    
+    if result.get("success"):
+        _set_cached_exists(cache_key, bool(result.get("exists")))
+    
+    return result
+
+
+def _query_master_exists(master_type, master_name, url=None):
+    """Uncached Tally lookup behind check_master_exists()"""
+    if not url:
+        settings = get_settings()
+        url = settings.tally_url
+    
+    collection_name = MASTER_COLLECTION_MAP.get(master_type, "Ledger")
+    
+    # ✅ WORKING XML with TDL - Same format as your test scripts
+    check_xml = _build_collection_export_xml(collection_name)
     
     try:
-        response = requests.post(
+        response = _SESSION.post(
             url,
             data=check_xml.encode("utf-8"),
             headers={"Content-Type": "text/xml; charset=utf-8"},
@@ -555,16 +805,7 @@ def check_master_exists(master_type, master_name, url=None):
                 }
             
             # Map master type to XML element name
-            element_map = {
-                "Group": "GROUP",
-                "Ledger": "LEDGER",
-                "StockGroup": "STOCKGROUP",
-                "StockItem": "STOCKITEM",
-                "Godown": "GODOWN",
-                "Unit": "UNIT",
-                "GSTClassification": "GSTCLASSIFICATION" 
-            }
-            element_name = element_map.get(master_type, master_type.upper())
+            element_name = MASTER_ELEMENT_MAP.get(master_type, master_type.upper())
             
             # Normalize search name for comparison
             search_normalized = normalize_name_for_comparison(master_name)
@@ -644,6 +885,150 @@ def check_master_exists(master_type, master_name, url=None):
         }
 
 
+def check_masters_exist_bulk(type_to_names, url=None, errors=None):
+    """
+    Check many masters in Tally with ONE collection export per master type
+    
+    check_master_exists() already pulls the whole collection to find a
+    single name, so an invoice with N items costs N identical round-trips.
+    This fetches each collection once and answers every name from it.
+    
+    Args:
+        type_to_names: {"Ledger": ["ACME Corp"], "StockItem": ["ITEM-001", ...]}
+        url: Tally URL (optional)
+        errors: dict (optional) - filled with {master_type: error message}
+                for every collection Tally could not be queried for
+    
+    Returns:
+        dict: {(master_type, master_name): bool}
+              Names are reported as missing if Tally could not be queried.
+    """
+    exists_map = {}
+    pending = {}
+    
+    for master_type, names in type_to_names.items():
+        uncached = []
+        for name in dict.fromkeys(names):
+            if not name:
+                continue
+            cached = _get_cached_exists(_master_exists_cache_key(master_type, name))
+            if cached is None:
+                uncached.append(name)
+            else:
+                exists_map[(master_type, name)] = cached
+        
+        if not uncached:
+            continue
+        
+        # A recent export of this collection answers every remaining name
+        tally_names = _get_cached_master_names(master_type)
+        if tally_names is None:
+            pending[master_type] = uncached
+            continue
+        
+        for name in uncached:
+            exists = normalize_name_for_comparison(name) in tally_names
+            exists_map[(master_type, name)] = exists
+            _set_cached_exists(_master_exists_cache_key(master_type, name), exists)
+    
+    if not pending:
+        return exists_map
+    
+    if not url:
+        url = get_settings().tally_url
+    
+    # Collections are independent and the wait is network I/O, so fetch
+    # them concurrently. Worker threads only do HTTP + parsing - they have
+    # no frappe.local, so caching and logging stay on this thread.
+    master_types = list(pending)
+    if len(master_types) == 1:
+        fetched = [_fetch_master_names(master_types[0], url)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(master_types), MASTER_FETCH_WORKERS)) as pool:
+            fetched = list(pool.map(lambda master_type: _fetch_master_names(master_type, url), master_types))
+    
+    for master_type, (tally_names, error) in zip(master_types, fetched, strict=True):
+        if error:
+            frappe.log_error(f"Bulk master check failed for {master_type}: {error}", "Tally Utils")
+        
+        if tally_names is None and errors is not None:
+            errors[master_type] = error or f"Tally did not return the {master_type} collection"
+        
+        if tally_names is not None:
+            _set_cached_master_names(master_type, tally_names)
+        
+        for name in pending[master_type]:
+            exists = tally_names is not None and normalize_name_for_comparison(name) in tally_names
+            exists_map[(master_type, name)] = exists
+            # Only cache real answers, never a failed query
+            if tally_names is not None:
+                _set_cached_exists(_master_exists_cache_key(master_type, name), exists)
+    
+    return exists_map
+
+
+def check_masters_bulk(pairs, url=None, errors=None):
+    """
+    check_masters_exist_bulk for a flat list of (master_type, name) pairs
+    
+    Example:
+        check_masters_bulk([("Ledger", "ACME Corp"), ("StockItem", "ITEM-001")])
+        -> {("Ledger", "ACME Corp"): True, ("StockItem", "ITEM-001"): False}
+    """
+    type_to_names = {}
+    for master_type, name in pairs:
+        type_to_names.setdefault(master_type, []).append(name)
+    
+    return check_masters_exist_bulk(type_to_names, url=url, errors=errors)
+
+
+def _fetch_master_names(master_type, url):
+    """
+    Export one Tally collection and return its normalized master names
+    Safe to run in a worker thread: touches no frappe state.
+    
+    Returns:
+        tuple: (set of normalized names, None) on success,
+               (None, None) on an HTTP/Tally error,
+               (None, error message) on an exception
+    """
+    collection_name = MASTER_COLLECTION_MAP.get(master_type, "Ledger")
+    element_name = MASTER_ELEMENT_MAP.get(master_type, master_type.upper())
+    
+    try:
+        response = _SESSION.post(
+            url,
+            data=_build_collection_export_xml(collection_name).encode("utf-8"),
+            headers={"Content-Type": "text/xml; charset=utf-8"},
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            return None, None
+        
+        root = ET.fromstring(response.text)
+        
+        if root.find(".//LINEERROR") is not None:
+            return None, None
+        
+        names = set()
+        for elem in root.findall(f".//{element_name}"):
+            tally_name = elem.get("NAME")
+            
+            if not tally_name:
+                name_elem = elem.find("NAME")
+                if name_elem is not None and name_elem.text:
+                    tally_name = name_elem.text
+            
+            if tally_name:
+                names.add(normalize_name_for_comparison(unescape_xml(tally_name)))
+        
+        return names, None
+    
+    except Exception as e:
+        return None, str(e)
+
+
 def validate_required_masters():
     """
     Check if all required masters exist in Tally
@@ -691,10 +1076,11 @@ def validate_required_masters():
     missing = []
     existing = []
     
+    # One export per master type, fetched concurrently by the bulk helper
+    exists_map = check_masters_bulk(masters_to_check, url=url)
+    
     for master_type, master_name in masters_to_check:
-        result = check_master_exists(master_type, master_name, url)
-        
-        if result.get("exists"):
+        if exists_map.get((master_type, master_name)):
             existing.append({"type": master_type, "name": master_name})
         else:
             missing.append({"type": master_type, "name": master_name})
@@ -955,7 +1341,7 @@ def send_xml_to_tally(log, xml):
     frappe.db.commit()
     
     try:
-        response = requests.post(
+        response = _SESSION.post(
             url,
             data=xml.encode("utf-8"),
             headers=headers,
@@ -1329,13 +1715,22 @@ def get_tally_company_for_erpnext_company(erpnext_company: str) -> str | None:
     v1.0 implementation is simple:
     - Read Company.tally_company_name (custom field you added)
     - If not set, fall back to Tally Integration Settings.tally_company_name
+
+    Memoized per request - builders call this once per master they create.
     """
     if not erpnext_company:
         return None
 
+    cache = get_request_cache("tally_company_for_erpnext_company")
+    if erpnext_company not in cache:
+        cache[erpnext_company] = _get_tally_company_for_erpnext_company(erpnext_company)
+    return cache[erpnext_company]
+
+
+def _get_tally_company_for_erpnext_company(erpnext_company):
     try:
         # Company field (recommended v1.0 mapping)
-        company = frappe.get_doc("Company", erpnext_company)
+        company = frappe.get_cached_doc("Company", erpnext_company)
         tally_company = getattr(company, "tally_company_name", None)
         if tally_company:
             return tally_company